@@ -0,0 +1,204 @@
+import argparse
+import datetime as dt
+import itertools
+import json
+import math
+import multiprocessing
+import os
+import pathlib
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import metaimageio
+from metaimageio import compression, header, reader
+
+try:
+    import resource
+except ModuleNotFoundError:
+    resource = None
+
+# every MetaIO element type, with a smaller default subset to keep a full run short
+DTYPES = {np.dtype(x).name: x for x in header.TYPES.values()}
+DEFAULT_DTYPES = 'uint8', 'int16', 'float32', 'float64'
+LAYOUTS = 'raw', 'compressed', 'msb', 'list'
+OPERATIONS = 'write', 'read', 'read_slices', 'read_roi', 'read_memmap', 'read_header'
+SUFFIXES = '.mha', '.mhd'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark metaimageio reader and writer.')
+    parser.add_argument('--inputs', type=pathlib.Path, nargs='+', default=(), help='images or directories of images to use instead of synthetic volumes')
+    parser.add_argument('--sizes', type=float, nargs='+', default=(1, 16, 256), help='volume sizes in MB')
+    parser.add_argument('--dtypes', nargs='+', default=DEFAULT_DTYPES, choices=tuple(DTYPES))
+    parser.add_argument('--suffixes', nargs='+', default=SUFFIXES, choices=SUFFIXES)
+    parser.add_argument('--layouts', nargs='+', default=LAYOUTS, choices=LAYOUTS)
+    parser.add_argument('--operations', nargs='+', default=OPERATIONS, choices=OPERATIONS)
+    parser.add_argument('--codecs', nargs='+', default=('zlib',), choices=tuple(compression.CODECS), help='codecs of the compressed layout')
+    parser.add_argument('--levels', type=int, nargs='+', default=(2,), help='compression levels of the compressed layout')
+    parser.add_argument('--repeat', type=int, default=3, help='number of timed repetitions per case')
+    parser.add_argument('--directory', type=pathlib.Path, default=None, help='directory for temporary files')
+    parser.add_argument('--output', type=pathlib.Path, default=None, help='save results to a JSON file')
+    parser.add_argument('--compare', type=pathlib.Path, default=None, help='compare with results from a JSON file')
+    args = parser.parse_args()
+
+    sources = [{'size_mb': size, 'dtype': dtype} for size, dtype in itertools.product(args.sizes, args.dtypes)]
+    if args.inputs:
+        inputs = []
+        for x in args.inputs:
+            inputs.extend(sorted(y for y in x.rglob('*') if y.suffix.lower() in SUFFIXES) if x.is_dir() else [x])
+        sources = [{'input': str(x.absolute())} for x in inputs]
+    cases = []
+    for source, suffix, layout, operation in itertools.product(sources, args.suffixes, args.layouts, args.operations):
+        if layout == 'list' and suffix == '.mha':
+            continue
+        if operation == 'read_memmap' and layout == 'compressed':
+            continue
+        for codec, level in itertools.product(args.codecs, args.levels) if layout == 'compressed' else [(None, None)]:
+            cases.append({**source, 'suffix': suffix, 'layout': layout, 'codec': codec, 'level': level, 'operation': operation, 'repeat': args.repeat})
+
+    # run each case in a fresh process to isolate its peak memory
+    results = []
+    context = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory(dir=args.directory) as directory:
+        for case in cases:
+            if case['operation'] != 'write':
+                with context.Pool(1) as pool:
+                    pool.apply(setup, (case, directory))
+            with context.Pool(1) as pool:
+                result = pool.apply(run, (case, directory))
+            results.append(result)
+            print(format_result(result), flush=True)
+
+    if args.output is not None:
+        args.output.write_text(json.dumps({'environment': environment(), 'results': results}, indent=2))
+    if args.compare is not None:
+        compare(json.loads(args.compare.read_text())['results'], results)
+
+
+def setup(case, directory):
+    clear(directory)
+    image = load(case)
+    filepath, kwargs = prepare(case, directory, image.shape)
+    metaimageio.write(filepath, image, **kwargs)
+
+
+def clear(directory):
+    for x in pathlib.Path(directory).iterdir():
+        x.unlink()
+
+
+def load(case):
+    if case.get('input') is not None:
+        image, _ = metaimageio.read(case['input'])
+        return image
+    dtype = DTYPES[case['dtype']]
+    shape = (max(1, round(case['size_mb'] * 2 ** 20 / (256 * 256 * np.dtype(dtype).itemsize))), 256, 256)
+    # fill slice by slice to keep the setup from dominating peak memory
+    rng = np.random.default_rng(0)
+    image = np.empty(shape, dtype=dtype)
+    low, high = (np.iinfo(dtype).min, np.iinfo(dtype).max) if np.issubdtype(dtype, np.integer) else (None, None)
+    for x in image:
+        x[...] = np.clip(rng.normal(100, 10, shape[1:]), low, high)
+    return image
+
+
+def prepare(case, directory, shape):
+    filepath = pathlib.Path(directory) / f'image{case["suffix"]}'
+    kwargs = {
+        'raw': {},
+        'compressed': {'CompressedData': True, 'CompressedDataCodec': case['codec'], 'compression_level': case['level']},
+        'msb': {'ElementByteOrderMSB': True}}.get(case['layout'])
+    if case['layout'] == 'list':
+        kwargs = {'ElementDataFile': [f'image{i:04d}.raw' for i in range(shape[0])]} if shape else {}
+    return filepath, kwargs
+
+
+def run(case, directory):
+    # only write cases hold the image, so the peak memory of reads is not masked by setting up the input
+    image = None
+    if case['operation'] == 'write':
+        clear(directory)
+        image = load(case)
+        filepath, kwargs = prepare(case, directory, image.shape)
+        shape, dtype = image.shape, image.dtype
+    else:
+        filepath, kwargs = prepare(case, directory, ())
+        volume = metaimageio.open(filepath)
+        shape, dtype = volume.shape, volume.dtype
+        del volume
+    # time parsing on every repetition instead of header cache hits
+    reader.set_header_cache_size(0)
+    roi = tuple(((n - min(64, n)) // 2, (n - min(64, n)) // 2 + min(64, n)) for n in shape)
+    operation = {
+        'write': lambda: metaimageio.write(filepath, image, **kwargs),
+        'read': lambda: metaimageio.read(filepath),
+        'read_slices': lambda: metaimageio.read(filepath, slices=range(0, shape[0], 4)),
+        'read_roi': lambda: metaimageio.read(filepath, roi=roi),
+        'read_memmap': lambda: np.asarray(metaimageio.read(filepath, memmap=True)[0]).sum(),
+        'read_header': lambda: metaimageio.read(filepath, slices=())}[case['operation']]
+    nbytes = {
+        'read_slices': len(range(0, shape[0], 4)) * math.prod(shape[1:]),
+        'read_roi': math.prod(x[1] - x[0] for x in roi),
+        'read_header': 0}.get(case['operation'], math.prod(shape)) * dtype.itemsize
+    baseline = peak_rss()
+    times = []
+    for _ in range(case['repeat']):
+        start = time.perf_counter()
+        operation()
+        times.append(time.perf_counter() - start)
+    median = statistics.median(times)
+    return {
+        **case,
+        'shape': shape,
+        'nbytes': nbytes,
+        'times_s': times,
+        'median_s': median,
+        'throughput_mb_s': nbytes / 2 ** 20 / median if median else None,
+        'file_bytes': sum(x.stat().st_size for x in pathlib.Path(directory).iterdir()),
+        'baseline_rss_mb': baseline,
+        'peak_rss_mb': peak_rss()}
+
+
+def peak_rss():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 2 ** 20 if sys.platform == 'darwin' else rss / 2 ** 10
+
+
+def environment():
+    return {
+        'timestamp': dt.datetime.now(dt.timezone.utc).isoformat(),
+        'metaimageio': metaimageio.__version__,
+        'numpy': np.__version__,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count()}
+
+
+def key(result):
+    return tuple(result[x] for x in ('input', 'size_mb', 'dtype', 'suffix', 'layout', 'codec', 'level', 'operation') if result.get(x) is not None)
+
+
+def format_result(result):
+    rss = '' if result['peak_rss_mb'] is None else f' {result["peak_rss_mb"] - result["baseline_rss_mb"]:9.1f} MB peak RSS increase'
+    ratio = f' {result["nbytes"] / result["file_bytes"]:6.2f} ratio' if result['layout'] == 'compressed' and result['operation'] == 'write' else ''
+    return f'{" ".join(str(x) for x in key(result)):50} {result["median_s"] * 1e3:10.2f} ms {result["throughput_mb_s"] or 0:10.1f} MB/s{rss}{ratio}'
+
+
+def compare(baselines, results):
+    baselines = {key(x): x for x in baselines}
+    for result in results:
+        baseline = baselines.get(key(result))
+        if baseline is not None:
+            print(f'{" ".join(str(x) for x in key(result)):50} {baseline["median_s"] / result["median_s"]:6.2f}x speedup')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,15 @@
 import contextlib as _contextlib
 
 from . import util  # noqa: F401
-from .reader import read  # noqa: F401
+from .aio import aread, awrite  # noqa: F401
+from .cache import ArrayCache, DiskCache  # noqa: F401
+from .catalog import Catalog  # noqa: F401
+from .pyramid import level_for, write_pyramid  # noqa: F401
+from .reader import read, read_header, read_many  # noqa: F401
+from .stats import Stats  # noqa: F401
 from .version import __version__  # noqa: F401
-from .writer import write  # noqa: F401
+from .volume import open  # noqa: A004, F401
+from .writer import MetaImageWriter, write  # noqa: F401
 
 with _contextlib.suppress(ModuleNotFoundError):
     from . import imageio  # noqa: F401
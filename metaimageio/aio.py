@@ -0,0 +1,89 @@
+import asyncio
+import functools
+import math
+import threading
+
+import numpy as np
+
+from . import reader, writer
+from .reader import _check_slices
+from .volume import Volume
+
+CHUNK_SIZE = 2 ** 24
+
+
+async def aread(filepath, slices=None, memmap=False, executor=None, semaphore=None, chunk_size=CHUNK_SIZE):
+    if memmap:
+        return await _run(executor, semaphore, functools.partial(reader.read, filepath, slices=slices, memmap=True))
+    volume = await _run(executor, semaphore, Volume, filepath)
+    slices = _check_slices(slices, len(volume))
+    image = np.empty((len(slices), *volume.shape[1:]), dtype=volume.dtype) if slices else None
+    k = 0
+    async for slab in aiter_slabs(volume, size=_size(volume, chunk_size), slices=slices, executor=executor, semaphore=semaphore):
+        image[k:k + len(slab)] = slab
+        k += len(slab)
+    return image, volume.meta
+
+
+async def awrite(filepath, image=None, executor=None, semaphore=None, chunk_size=CHUNK_SIZE, **kwargs):
+    if image is None or isinstance(kwargs.get('ElementDataFile'), (tuple, list)) or 'CompressedBlockSlices' in kwargs or kwargs.get('threads', 1) > 1:
+        return await _run(executor, semaphore, functools.partial(writer.write, filepath, image, **kwargs))
+    image = np.asarray(image)
+    if image.ndim < 1 or not len(image):
+        return await _run(executor, semaphore, functools.partial(writer.write, filepath, image, **kwargs))
+    kwargs.pop('threads', None)
+    size = max(1, chunk_size // max(1, image[0].nbytes))
+    stream = writer.MetaImageWriter(filepath, **kwargs)
+    lock = threading.Lock()
+    try:
+        for j in range(0, len(image), size):
+            await _run(executor, semaphore, _locked, lock, stream.append, image[j:j + size])
+    except BaseException:
+        # leave no truncated image behind on cancellation or failure
+        _cleanup(executor, lock, stream.abort)
+        raise
+    return await _run(executor, semaphore, _locked, lock, stream.close)
+
+
+async def aiter_slabs(volume, size=1, slices=None, executor=None, semaphore=None):
+    # iterate over slabs, reading the next slab only when requested and allowing cancellation between slabs
+    if not isinstance(volume, Volume):
+        volume = await _run(executor, semaphore, Volume, volume)
+    iterator = volume.slabs(size, slices)
+    lock = threading.Lock()
+    exhausted = False
+    try:
+        while True:
+            slab = await _run(executor, semaphore, _locked, lock, next, iterator, None)
+            if slab is None:
+                exhausted = True
+                break
+            yield slab
+    finally:
+        if not exhausted:
+            _cleanup(executor, lock, iterator.close)
+
+
+async def _run(executor, semaphore, function, *args):
+    if semaphore is None:
+        return await asyncio.get_running_loop().run_in_executor(executor, function, *args)
+    async with semaphore:
+        return await asyncio.get_running_loop().run_in_executor(executor, function, *args)
+
+
+def _locked(lock, function, *args):
+    with lock:
+        return function(*args)
+
+
+def _cleanup(executor, lock, function):
+    # run function once the job holding the lock has finished, without blocking the event loop
+    try:
+        asyncio.get_running_loop().run_in_executor(executor, _locked, lock, function)
+    except RuntimeError:
+        # the executor is shut down, so no job is running
+        _locked(lock, function)
+
+
+def _size(volume, chunk_size):
+    return max(1, chunk_size // max(1, volume.dtype.itemsize * math.prod(volume.shape[1:])))
@@ -0,0 +1,151 @@
+import collections
+import contextlib
+import hashlib
+import math
+import os
+import pathlib
+import threading
+
+import numpy as np
+
+from . import reader
+from .reader import _check_slices, _read_header, _take
+from .volume import Volume
+
+CHUNK_SIZE = 2 ** 24
+MAX_BYTES = 2 ** 30
+MAX_DISK_BYTES = 2 ** 34
+
+
+class ArrayCache:
+
+    def __init__(self, max_bytes=MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def read(self, filepath, slices=None, roi=None, workers=1):
+        # serve decoded images shared between callers as read-only arrays, evicting the least recently used
+        filepath = pathlib.Path(filepath)
+        key = (
+            _identity(filepath),
+            None if slices is None else tuple(int(x) for x in slices),
+            None if roi is None else tuple(None if x is None else (int(x[0]), int(x[1])) for x in roi))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+        if entry is None:
+            image, meta = reader.read(filepath, slices=slices, roi=roi, workers=workers)
+            if image is not None:
+                image.flags.writeable = False
+            entry = image, meta
+            self._put(key, entry)
+        image, meta = entry
+        return image, {x: y.copy() if isinstance(y, np.ndarray) else y for x, y in meta.items()}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def _put(self, key, entry):
+        nbytes = 0 if entry[0] is None else entry[0].nbytes
+        if nbytes > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = entry
+            self.nbytes += nbytes
+            while self.nbytes > self.max_bytes:
+                _, (image, _) = self._entries.popitem(last=False)
+                self.nbytes -= 0 if image is None else image.nbytes
+                self.evictions += 1
+
+
+class DiskCache:
+
+    def __init__(self, directory, max_bytes=MAX_DISK_BYTES):
+        self.directory = pathlib.Path(directory)
+        self.max_bytes = max_bytes
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def read(self, filepath, slices=None):
+        # map a decompressed copy of the image, writing it on first access
+        volume = Volume(filepath)
+        cachepath = self.directory / f'{self._key(volume)}.npy'
+        try:
+            os.utime(cachepath)
+            image = np.load(cachepath, mmap_mode='c')
+        except FileNotFoundError:
+            # not cached yet, or evicted by another process in between
+            self._write(volume, cachepath)
+            self._evict(cachepath)
+            image = np.load(cachepath, mmap_mode='c')
+        if slices is not None:
+            slices = _check_slices(slices, len(volume))
+            image = _take(image, slices) if slices else None
+        return image, volume.meta
+
+    def clear(self):
+        for cachepath in self.directory.glob('*.npy'):
+            with contextlib.suppress(OSError):
+                cachepath.unlink()
+
+    def _key(self, volume):
+        return hashlib.sha256('\n'.join(_identity(volume.filepath)).encode()).hexdigest()
+
+    def _write(self, volume, cachepath):
+        # fill a process and thread specific file slab by slab and publish it atomically
+        temppath = cachepath.with_suffix(f'.{os.getpid()}.{threading.get_ident()}.tmp')
+        try:
+            image = np.lib.format.open_memmap(temppath, mode='w+', dtype=volume.dtype, shape=volume.shape)
+            size = max(1, CHUNK_SIZE // max(1, volume.dtype.itemsize * math.prod(volume.shape[1:])))
+            k = 0
+            for slab in volume.slabs(size):
+                image[k:k + len(slab)] = slab
+                k += len(slab)
+            image.flush()
+            del image
+            temppath.replace(cachepath)
+        finally:
+            with contextlib.suppress(FileNotFoundError):
+                temppath.unlink()
+
+    def _evict(self, keep):
+        # remove the least recently used files until the directory fits in max_bytes
+        entries = []
+        for cachepath in self.directory.glob('*.npy'):
+            with contextlib.suppress(FileNotFoundError):
+                stat = cachepath.stat()
+                entries.append((stat.st_mtime_ns, stat.st_size, cachepath))
+        nbytes = sum(x[1] for x in entries)
+        for _, size, cachepath in sorted(entries):
+            if nbytes <= self.max_bytes:
+                break
+            if cachepath == keep:
+                continue
+            with contextlib.suppress(OSError):
+                cachepath.unlink()
+                nbytes -= size
+
+
+def _identity(filepath):
+    # identity of the header and all data files
+    identity = []
+    _, datapaths, _ = _read_header(filepath)
+    for path in dict.fromkeys((filepath, *datapaths)):
+        stat = path.stat()
+        identity.append(f'{path.absolute()}:{stat.st_mtime_ns}:{stat.st_size}:{stat.st_ino}')
+    return tuple(identity)
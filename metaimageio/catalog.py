@@ -0,0 +1,119 @@
+import concurrent.futures
+import os
+import pathlib
+
+import numpy as np
+
+from . import header
+
+# columns stored per file, next to its relative path, mtime and size
+COLUMNS = 'NDims', 'DimSize', 'ElementSpacing', 'Position', 'ElementType', 'ElementNumberOfChannels', 'CompressedData', 'Modality', 'AnatomicalOrientation'
+EXTENSIONS = '.mha', '.mhd'
+INDEX_NAME = '.metaimageio-catalog.npz'
+
+
+class Catalog:
+
+    def __init__(self, root, filepath=None):
+        self.root = pathlib.Path(root)
+        self.filepath = self.root / INDEX_NAME if filepath is None else pathlib.Path(filepath)
+        self.columns = _columns([])
+        self.errors = {}
+        if self.filepath.exists():
+            with np.load(self.filepath, allow_pickle=False) as data:
+                self.columns = dict(data)
+
+    def __len__(self):
+        return len(self.columns['path'])
+
+    def refresh(self, workers=None):
+        # parse headers of new or modified files only, in parallel, and save the index
+        rows = {}
+        for i, path in enumerate(self.columns['path'].tolist()):
+                rows[path] = {x: _trim(y[i]) if y.ndim > 1 else y[i] for x, y in self.columns.items()}
+        stats = {}
+        for filepath in self.root.rglob('*'):
+            if filepath.suffix.lower() in EXTENSIONS and filepath.is_file():
+                stat = filepath.stat()
+                stats[filepath.relative_to(self.root).as_posix()] = stat.st_mtime_ns, stat.st_size
+        pending = [x for x, y in stats.items() if x not in rows or (int(rows[x]['mtime_ns']), int(rows[x]['size'])) != y]
+        rows = {x: y for x, y in rows.items() if x in stats}
+        self.errors = {}
+        workers = workers or min(32, (os.cpu_count() or 1) + 4)
+        with concurrent.futures.ThreadPoolExecutor(workers) as executor:
+            for path, row in zip(pending, executor.map(self._parse, pending)):
+                if isinstance(row, Exception):
+                    self.errors[path] = row
+                    rows.pop(path, None)
+                    continue
+                rows[path] = {'path': path, 'mtime_ns': stats[path][0], 'size': stats[path][1], **row}
+        self.columns = _columns([rows[x] for x in sorted(rows)])
+        self._save()
+        return self
+
+    def query(self, **conditions):
+        # select rows by equality with a value, or by a function returning a mask given a column
+        mask = np.ones(len(self), dtype=bool)
+        for key, condition in conditions.items():
+            if key not in self.columns:
+                raise ValueError(f'Column "{key}" is not in the catalog')
+            column = self.columns[key]
+            if callable(condition):
+                mask &= np.asarray(condition(column), dtype=bool)
+            elif column.ndim > 1:
+                condition = np.asarray(condition)
+                if len(condition) > column.shape[1]:
+                    # longer than any row, no match
+                    mask[:] = False
+                    continue
+                mask &= np.all(column[:, :len(condition)] == condition, axis=1) & (self.columns['NDims'] == len(condition))
+            else:
+                mask &= column == condition
+        result = {x: y[mask] for x, y in self.columns.items()}
+        result['path'] = np.array([str(self.root / x) for x in result['path']], dtype=str)
+        return result
+
+    def _parse(self, path):
+        try:
+            meta, _, _ = header.read(self.root / path)
+        except (OSError, ValueError, UnicodeDecodeError) as exception:
+            return exception
+        row = {x: meta[x] for x in COLUMNS}
+        row['ElementType'] = header.FORMATTERS['ElementType'](meta['ElementType']) if meta['ElementType'] is not None else ''
+        return row
+
+    def _save(self):
+        temppath = self.filepath.with_name(f'{self.filepath.name}.{os.getpid()}.tmp')
+        with temppath.open('wb') as f:
+            np.savez_compressed(f, **self.columns)
+        temppath.replace(self.filepath)
+
+
+def _columns(rows):
+    # stack rows into columns, padding arrays of varying length
+    columns = {
+        'path': np.array([x['path'] for x in rows], dtype=str),
+        'mtime_ns': np.array([x['mtime_ns'] for x in rows], dtype=np.int64),
+        'size': np.array([x['size'] for x in rows], dtype=np.int64)}
+    for key, dtype, fill in (
+            ('NDims', np.int64, 0), ('ElementNumberOfChannels', np.int64, 1), ('CompressedData', bool, False),
+            ('ElementType', str, ''), ('Modality', str, ''), ('AnatomicalOrientation', str, '')):
+        columns[key] = np.array([fill if _missing(x[key]) else x[key] for x in rows], dtype=dtype)
+    for key, dtype, fill in (('DimSize', np.int64, 0), ('ElementSpacing', float, np.nan), ('Position', float, np.nan)):
+        values = [np.ravel([] if _missing(x[key]) else x[key]) for x in rows]
+        column = np.full((len(rows), max((len(x) for x in values), default=0)), fill, dtype=dtype)
+        for i, x in enumerate(values):
+            column[i, :len(x)] = x
+        columns[key] = column
+    return columns
+
+
+def _trim(value):
+    # strip the padding of array columns
+    if np.issubdtype(value.dtype, np.floating):
+        return value[:len(value) - np.argmin(np.isnan(value[::-1]))] if not np.all(np.isnan(value)) else value[:0]
+    return np.trim_zeros(value, 'b')
+
+
+def _missing(value):
+    return value is None or (isinstance(value, str) and not value)
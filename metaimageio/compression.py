@@ -0,0 +1,140 @@
+import bz2
+import collections
+import concurrent.futures
+import io
+import lzma
+import zlib
+
+try:
+    # faster drop-in replacement producing standard zlib streams
+    from zlib_ng import zlib_ng as _zlib
+except ModuleNotFoundError:
+    _zlib = zlib
+
+CHUNK_SIZE = 2 ** 20
+COMPRESS_CHUNK_SIZE = 2 ** 22
+
+# codec name -> (compressor factory taking a level, decompressor factory)
+CODECS = {
+    'zlib': (_zlib.compressobj, _zlib.decompressobj),
+    'lzma': (lambda level: lzma.LZMACompressor(preset=level), lzma.LZMADecompressor),
+    'bz2': (bz2.BZ2Compressor, bz2.BZ2Decompressor)}
+
+
+def register_codec(name, compressor, decompressor):
+    CODECS[name.lower()] = (compressor, decompressor)
+
+
+def compressor(codec='zlib', level=2):
+    return _codec(codec)[0](level)
+
+
+def decompressor(codec='zlib'):
+    return _codec(codec)[1]()
+
+
+def _codec(codec):
+    try:
+        return CODECS[(codec or 'zlib').lower()]
+    except KeyError as exception:
+        raise ValueError(f'Compression codec "{codec}" is not supported') from exception
+
+
+def compress(data, level=2, threads=1, chunk_size=COMPRESS_CHUNK_SIZE, codec='zlib'):
+    data = memoryview(data).cast('B')
+    return b''.join(compress_chunks((data[i:i + chunk_size] for i in range(0, len(data), chunk_size)), level, threads, codec))
+
+
+def compress_chunks(chunks, level=2, threads=1, codec='zlib'):
+    # compress an iterable of chunks into the pieces of a single compressed stream
+    if threads <= 1 or (codec or 'zlib').lower() != 'zlib':
+        stream = compressor(codec, level)
+        pieces = [stream.compress(x) for x in chunks]
+        pieces.append(stream.flush())
+        return pieces
+    # deflate chunks in parallel and stitch them at full flush boundaries, bounding the number of chunks in flight
+    pieces = [_zlib.compress(b'', level)[:2]]
+    checksum = 1
+    with concurrent.futures.ThreadPoolExecutor(threads) as executor:
+        futures = collections.deque()
+        for chunk in chunks:
+            futures.append(executor.submit(_deflate, chunk, level))
+            while len(futures) > 2 * threads or (futures and futures[0].done()):
+                deflate, x, size = futures.popleft().result()
+                pieces.append(deflate)
+                checksum = adler32_combine(checksum, x, size)
+        for future in futures:
+            deflate, x, size = future.result()
+            pieces.append(deflate)
+            checksum = adler32_combine(checksum, x, size)
+    pieces.append(_zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS).flush())
+    pieces.append(checksum.to_bytes(4, 'big'))
+    return pieces
+
+
+def adler32_combine(adler1, adler2, size2):
+    # https://github.com/madler/zlib/blob/develop/adler32.c
+    base = 65521
+    remainder = size2 % base
+    sum1 = adler1 & 0xffff
+    sum2 = (remainder * sum1) % base
+    sum1 = (sum1 + (adler2 & 0xffff) + base - 1) % base
+    sum2 = (sum2 + ((adler1 >> 16) & 0xffff) + ((adler2 >> 16) & 0xffff) + base - remainder) % base
+    return (sum2 << 16) | sum1
+
+
+def _deflate(data, level):
+    stream = _zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    return stream.compress(data) + stream.flush(zlib.Z_FULL_FLUSH), _zlib.adler32(data), len(memoryview(data).cast('B'))
+
+
+class DecompressReader(io.RawIOBase):
+
+    def __init__(self, f, size=None, chunk_size=CHUNK_SIZE, codec='zlib'):
+        super().__init__()
+        self._f = f
+        self._size = size
+        self._chunk_size = chunk_size
+        self._decompressor = decompressor(codec)
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        buffer = memoryview(buffer).cast('B')
+        n = 0
+        while n < len(buffer) and not self._decompressor.eof:
+            # zlib hands back unconsumed input while lzma and bz2 buffer it internally
+            data = getattr(self._decompressor, 'unconsumed_tail', b'')
+            buffered = not getattr(self._decompressor, 'needs_input', True)
+            if not data and not buffered and self._size != 0:
+                data = self._f.read(self._chunk_size if self._size is None else min(self._chunk_size, self._size))
+                if self._size is not None:
+                    self._size -= len(data)
+            # bound decompressed output by the space left in the buffer
+            out = self._decompressor.decompress(data, len(buffer) - n)
+            if not data and not out and not buffered:
+                break
+            buffer[n:n + len(out)] = out
+            n += len(out)
+        self._position += n
+        return n
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            offset -= self._position
+        elif whence != io.SEEK_CUR:
+            raise io.UnsupportedOperation('DecompressReader only supports SEEK_SET and SEEK_CUR')
+        if offset < 0:
+            raise io.UnsupportedOperation('DecompressReader only supports seeking forward')
+        buffer = memoryview(bytearray(min(offset, self._chunk_size)))
+        while offset:
+            n = self.readinto(buffer[:offset])
+            if not n:
+                break
+            offset -= n
+        return self._position
+
+    def tell(self):
+        return self._position
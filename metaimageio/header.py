@@ -0,0 +1,222 @@
+import math
+import pathlib
+import re
+import shlex
+
+import numpy as np
+
+# https://itk.org/Wiki/ITK/MetaIO/Documentation#Reference:_Tags_of_MetaImage
+TAGS = (
+    'Comment',                  # MET_STRING
+    'ObjectType',               # MET_STRING (Image)
+    'ObjectSubType',            # MET_STRING
+    'TransformType',            # MET_STRING (Rigid)
+    'NDims',                    # MET_INT
+    'Name',                     # MET_STRING
+    'ID',                       # MET_INT
+    'ParentID',                 # MET_INT
+    'CompressedData',           # MET_STRING (boolean)
+    'CompressedDataSize',       # MET_INT
+    'CompressedBlockSlices',    # MET_INT (non-standard tag for handling independently compressed blocks of slices)
+    'CompressedBlockSizes',     # MET_INT_ARRAY[NBlocks] (non-standard tag for handling random access to compressed blocks)
+    'CompressedDataCodec',      # MET_STRING (non-standard tag for handling compression codecs other than zlib)
+    'BinaryData',               # MET_STRING (boolean)
+    'BinaryDataByteOrderMSB',   # MET_STRING (boolean)
+    'ElementByteOrderMSB',      # MET_STRING (boolean)
+    'Color',                    # MET_FLOAT_ARRAY[4]
+    'Position',                 # MET_FLOAT_ARRAY[NDims]
+    'Offset',                   # == Position
+    'Origin',                   # == Position
+    'Orientation',              # MET_FLOAT_MATRIX[NDims][NDims]
+    'Rotation',                 # == Orientation
+    'TransformMatrix',          # == Orientation
+    'CenterOfRotation',         # MET_FLOAT_ARRAY[NDims]
+    'AnatomicalOrientation',    # MET_STRING (RAS)
+    'ElementSpacing',           # MET_FLOAT_ARRAY[NDims]
+    'DimSize',                  # MET_INT_ARRAY[NDims]
+    'HeaderSize',               # MET_INT
+    'HeaderSizePerSlice',       # MET_INT (non-standard tag for handling per slice header)
+    'HeaderSizesPerDataFile',   # MET_INT_ARRAY[NDataFile] (non-standard tag for handling variable per ElementDataFile header)
+    'Modality',                 # MET_STRING (MET_MOD_CT)
+    'SequenceID',               # MET_INT_ARRAY[4]
+    'ElementMin',               # MET_FLOAT
+    'ElementMax',               # MET_FLOAT
+    'ElementNumberOfChannels',  # MET_INT
+    'ElementSize',              # MET_FLOAT_ARRAY[NDims]
+    'ElementType',              # MET_STRING (MET_UINT)
+    'ElementDataFile')          # MET_STRING
+
+TYPES = {
+    'MET_CHAR': np.int8,
+    'MET_UCHAR': np.uint8,
+    'MET_SHORT': np.int16,
+    'MET_USHORT': np.uint16,
+    'MET_INT': np.int32,
+    'MET_UINT': np.uint32,
+    'MET_LONG': np.int64,
+    'MET_ULONG': np.uint64,
+    'MET_FLOAT': np.float32,
+    'MET_DOUBLE': np.float64}
+
+BLOCK_SIZE = 2 ** 16
+
+# case insensitive lookups
+TAG_NAMES = {x.upper(): x for x in TAGS}
+TYPE_NAMES = {x.upper(): y for x, y in TYPES.items()}
+
+STRING_TAGS = 'Comment', 'ObjectType', 'ObjectSubType', 'TransformType', 'Name', 'AnatomicalOrientation', 'Modality', 'CompressedDataCodec'
+INT_TAGS = 'NDims', 'ID', 'ParentID', 'CompressedDataSize', 'CompressedBlockSlices', 'HeaderSize', 'HeaderSizePerSlice', 'ElementNumberOfChannels'
+BOOL_TAGS = 'CompressedData', 'BinaryData', 'BinaryDataByteOrderMSB', 'ElementByteOrderMSB'
+FLOAT_TAGS = 'ElementMin', 'ElementMax'
+FLOAT_ARRAY_TAGS = 'Color', 'Position', 'Offset', 'Origin', 'CenterOfRotation', 'ElementSpacing', 'ElementSize'
+INT_ARRAY_TAGS = 'DimSize', 'CompressedBlockSizes', 'HeaderSizesPerDataFile', 'SequenceID'
+MATRIX_TAGS = 'Orientation', 'Rotation', 'TransformMatrix'
+
+_DATA_FILE = re.compile(rb'^[ \t]*ElementDataFile[ \t]*=[^\n]*\n', re.IGNORECASE | re.MULTILINE)
+
+
+def _parse_int(value):
+    return int(value)
+
+
+def _parse_bool(value):
+    return value.upper() == 'TRUE'
+
+
+def _parse_float_array(value):
+    return np.array(value.split(), dtype=float)
+
+
+def _parse_int_array(value):
+    return np.array(value.split(), dtype=int)
+
+
+def _parse_matrix(value):
+    value = np.array(value.split(), dtype=float)
+    n = math.isqrt(len(value))
+    return value.reshape(n, n).transpose()
+
+
+def _parse_type(value):
+    try:
+        return TYPE_NAMES[value.upper()]
+    except KeyError as exception:
+        raise ValueError(f'ElementType "{value}" is not supported') from exception
+
+
+def _format_array(value):
+    return ' '.join(str(x) for x in np.ravel(value))
+
+
+def _format_matrix(value):
+    return ' '.join(str(x) for x in np.ravel(np.transpose(value)))
+
+
+def _format_type(value):
+    try:
+        return [x for x, y in TYPES.items() if np.issubdtype(value, y)][0]
+    except IndexError as exception:
+        raise ValueError(f'ElementType "{value}" is not supported') from exception
+
+
+PARSERS = {
+    **dict.fromkeys(INT_TAGS, _parse_int),
+    **dict.fromkeys(BOOL_TAGS, _parse_bool),
+    **dict.fromkeys(FLOAT_TAGS, float),
+    **dict.fromkeys(FLOAT_ARRAY_TAGS, _parse_float_array),
+    **dict.fromkeys(INT_ARRAY_TAGS, _parse_int_array),
+    **dict.fromkeys(MATRIX_TAGS, _parse_matrix),
+    'ElementType': _parse_type}
+
+FORMATTERS = {
+    **dict.fromkeys(INT_TAGS + BOOL_TAGS + FLOAT_TAGS, str),
+    **dict.fromkeys(FLOAT_ARRAY_TAGS + INT_ARRAY_TAGS, _format_array),
+    **dict.fromkeys(MATRIX_TAGS, _format_matrix),
+    'ElementType': _format_type}
+
+
+def read(filepath, stats=None):
+    # read up to the ElementDataFile line in bounded blocks, and the remainder only for LIST
+    data = bytearray()
+    with filepath.open('rb') if stats is None else stats.open(filepath) as f:
+        while True:
+            start = data.rfind(b'\n') + 1
+            block = f.read(BLOCK_SIZE)
+            data += block
+            if not block:
+                data += b'\n'
+                break
+            match = _DATA_FILE.search(data, start)
+            if match:
+                if match.group().split(b'=', 1)[1].strip().upper() == b'LIST':
+                    data += f.read()
+                break
+    return parse(bytes(data), filepath)
+
+
+def parse(data, filepath):
+    # parse header bytes, only decoding values
+    meta_in = {}
+    meta_size = 0
+    islocal = False
+    lines = data.split(b'\n')
+    for i, line in enumerate(lines):
+        meta_size += len(line) + 1
+        line = line.strip()
+        # skip empty and commented lines
+        if not line or line.startswith(b'#'):
+            continue
+        key, separator, value = line.partition(b'=')
+        key = key.strip().decode()
+        key = TAG_NAMES.get(key.upper(), key)
+        value = value.strip().decode() if separator else key
+        meta_in[key] = value
+        # handle supported ElementDataFile formats
+        if key != 'ElementDataFile':
+            continue
+        if value.upper() == 'LIST':
+            meta_in[key] = [x.strip().decode() for x in lines[i + 1:] if x.strip()]
+        elif value.upper() == 'LOCAL':
+            meta_in[key] = [str(filepath)]
+            islocal = True
+        elif '%' in value:
+            args = shlex.split(value)
+            meta_in[key] = [args[0] % j for j in range(int(args[1]), int(args[2]) + int(args[3]), int(args[3]))]
+        else:
+            meta_in[key] = [value]
+        break
+
+    # typecast metadata to native types
+    meta = dict.fromkeys(TAGS, None)
+    for key, value in meta_in.items():
+        meta[key] = PARSERS[key](value) if key in PARSERS else value
+    # skip header if size is -1 (https://github.com/Kitware/MetaIO/blob/56c9257467fa901e51e67ca5934711869ed84e49/src/metaImage.cxx#L2606)
+    if meta['HeaderSize'] == -1:
+        meta['HeaderSize'] = 0
+
+    # resolve paths to data files
+    datapaths = []
+    for datapath in meta['ElementDataFile'] or ():
+        datapath = pathlib.Path(datapath)
+        if filepath != datapath and not datapath.is_absolute():
+            datapath = filepath.parent / datapath
+        datapaths.append(datapath)
+
+    return meta, datapaths, meta_size if islocal else 0
+
+
+def format_meta(meta):
+    # typecast metadata to string
+    meta_out = {}
+    for key, value in meta.items():
+        if value is None:
+            continue
+        if key == 'ElementDataFile' and isinstance(value, (tuple, list)):
+            meta_out[key] = '\n'.join(['LIST', *(str(x) for x in value)])
+        else:
+            meta_out[key] = FORMATTERS[key](value) if key in FORMATTERS else value
+    return meta_out
+
+
+def serialize(meta_out):
+    return ''.join(f'{key} = {value}\n' for key, value in meta_out.items()).encode()
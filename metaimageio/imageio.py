@@ -1,42 +1,59 @@
 import numpy as np
 
 from . import reader, writer
+from .volume import Volume
 
 EXTENSIONS = '.mha', '.mhd'
 
 
 try:
+    from imageio.core.request import InitializationError, IOMode
     from imageio.core.v3_plugin_api import ImageProperties, PluginV3
 
     class MetaImageIOPlugin(PluginV3):
 
         def __init__(self, request, **kwargs):
             super().__init__(request, **kwargs)
+            if request.extension not in EXTENSIONS:
+                raise InitializationError(f'MetaImageIO can not handle {request.extension} files')
             self._filepath = request.get_local_filename()
+            # parse the header once for the lifetime of the plugin
+            self._volume = Volume(self._filepath) if request.mode.io_mode == IOMode.read else None
 
         def read(self, index=None, **kwargs):
-            if index is not None:
-                kwargs.setdefault('slices', [index])
-            image, _ = reader.read(self._filepath, **kwargs)
-            return image
+            if index is None or index is Ellipsis:
+                image, _ = reader.read(self._filepath, **kwargs)
+                return image
+            if not kwargs:
+                return self._volume[index]
+            if 'slices' in kwargs or 'roi' in kwargs:
+                raise ValueError('Slices and roi cannot be used together with index')
+            image, _ = reader.read(self._filepath, slices=(range(len(self._volume))[index],), **kwargs)
+            return image[0]
+
+        def iter(self):
+            yield from self._volume
 
         def write(self, ndimage, **kwargs):
             writer.write(self._filepath, image=ndimage, **kwargs)
 
         def metadata(self, index=None, exclude_applied=True):
             _ = index, exclude_applied
-            _, meta = reader.read(self._filepath, slices=())
-            return meta
+            return self._volume.meta
 
         def properties(self, index=None):
-            _ = index
-            meta = self.metadata()
-            return ImageProperties(
-                shape=tuple(meta['DimSize']),
-                dtype=meta['ElementType'],
-                n_images=None,
-                is_batch=False,
-                spacing=tuple(meta['ElementSpacing']))
+            # shape and spacing in array order, with the outer axis as the batch dimension
+            shape = self._volume.shape
+            spacing = tuple(self._volume.meta.get('ElementSpacing', np.ones(len(shape)))[::-1])
+            if index is Ellipsis:
+                return ImageProperties(shape=shape, dtype=self._volume.dtype, n_images=len(self._volume), is_batch=True, spacing=spacing)
+            if index is None:
+                return ImageProperties(shape=shape, dtype=self._volume.dtype, n_images=None, is_batch=False, spacing=spacing)
+            return ImageProperties(shape=shape[1:], dtype=self._volume.dtype, n_images=None, is_batch=False, spacing=spacing[1:])
+
+        def close(self):
+            self._volume = None
+            super().close()
 
 except ModuleNotFoundError:
     pass
@@ -58,27 +75,36 @@ try:
             def _open(self, **kwargs):
                 _ = kwargs
                 self._filepath = self.request.get_local_filename()
+                self._volume = Volume(self._filepath)
+                self._slabs = None
+                self._index = None
 
             def _close(self):
-                pass
+                if self._slabs is not None:
+                    self._slabs.close()
+                self._slabs = None
 
             def _get_length(self):
-                return np.inf
+                # slices are served as separate images only in multi-image mode, otherwise the volume is a single image
+                return len(self._volume) if self.request.mode[1] == 'I' else 1
 
             def _get_data(self, index, **kwargs):
                 _ = kwargs
-                if index != 0:
-                    raise NotImplementedError('MetaImageIO does not support non-zero indices')
+                if self.request.mode[1] == 'I':
+                    # read consecutive slices from a handle that stays open, restarting on random access
+                    if self._slabs is None or index != self._index:
+                        self._close()
+                        self._slabs = self._volume.slabs(slices=range(index, len(self._volume)))
+                    self._index = index + 1
+                    return next(self._slabs)[0], self._volume.meta
                 image, meta = reader.read(self._filepath, **self.request.kwargs)
                 if image is None:
                     image = np.array(())
                 return image, meta
 
             def _get_meta_data(self, index):
-                if index != 0:
-                    raise NotImplementedError('MetaImageIO does not support non-zero indices')
-                _, meta = reader.read(self._filepath, slices=())
-                return meta
+                _ = index
+                return self._volume.meta
 
         class Writer(core.Format.Writer):
 
@@ -105,7 +131,7 @@ try:
                 name,
                 'MetaImageIO',
                 ' '.join(EXTENSIONS),
-                'iv'))
+                'iIv'))
             formats.sort(name, *names)
         return name
 
@@ -0,0 +1,95 @@
+import json
+
+import numpy as np
+
+from . import util
+from .reader import _pyramid_path, _read_pyramid
+from .volume import Volume
+from .writer import MetaImageWriter
+
+MIN_SIZE = 64
+
+# tags carried over to downsampled levels, the rest are either derived from the data or specific to the source file
+KEEP_TAGS = (
+    'Comment', 'ObjectType', 'ObjectSubType', 'TransformType', 'Name', 'ID', 'ParentID', 'Position', 'Offset', 'Origin', 'Orientation', 'Rotation', 'TransformMatrix',
+    'CenterOfRotation', 'AnatomicalOrientation', 'ElementSpacing', 'Modality', 'SequenceID', 'ElementNumberOfChannels', 'ElementSize')
+
+
+def write_pyramid(filepath, levels=None, factor=2, **kwargs):
+    # write downsampled levels next to the image in a single pass over its slabs
+    volume = Volume(filepath)
+    meta = volume.meta
+    axes = volume.ndim - int((meta.get('ElementNumberOfChannels') or 1) > 1)
+    if levels is None:
+        # halve until the largest dimension would drop below MIN_SIZE
+        levels = 1
+        while max(volume.shape[:axes]) / factor ** (levels + 1) >= MIN_SIZE:
+            levels += 1
+    filepaths = [volume.filepath.with_name(f'{volume.filepath.stem}_L{k}.mha') for k in range(1, levels + 1)]
+    writers = [MetaImageWriter(x, **_level_meta(meta, axes, factor ** k), **kwargs) for k, x in enumerate(filepaths, 1)]
+    try:
+        for slab in volume.slabs(size=factor ** levels):
+            image = slab
+            for stream in writers:
+                image = _downsample(image, factor, axes)
+                stream.append(_cast(image, volume.dtype))
+    except BaseException:
+        # leave no truncated levels behind
+        for stream in writers:
+            stream.abort()
+        raise
+    metas = [x.close() for x in writers]
+    stat = volume.filepath.stat()
+    index = {
+        'file': volume.filepath.name,
+        'mtime_ns': stat.st_mtime_ns,
+        'size': stat.st_size,
+        'factor': factor,
+        'levels': [{'file': x.name, 'shape': list(Volume(x).shape)} for x in filepaths]}
+    _pyramid_path(volume.filepath).write_text(json.dumps(index, indent=2))
+    return metas
+
+
+def level_for(filepath, shape):
+    # coarsest level whose trailing dimensions are at least as large as shape
+    index = _read_pyramid(Volume(filepath).filepath)
+    if index is None:
+        return 0
+    level = 0
+    for k, x in enumerate(index['levels'], 1):
+        if all(n >= m for n, m in zip(x['shape'][-len(shape):], shape)):
+            level = k
+    return level
+
+
+def _level_meta(meta, axes, scale):
+    meta = {x: y for x, y in meta.items() if x in KEEP_TAGS}
+    spacing = np.array(meta.get('ElementSpacing', np.ones(axes)), dtype=float)
+    # move the position to the center of the first block of voxels
+    shift = (scale - 1) / 2 * spacing[:axes]
+    if axes == 3:
+        shift = util.get_transform(meta)[:3, :3] @ shift
+    for key in ('Position', 'Offset', 'Origin'):
+        if key in meta:
+            meta[key] = np.asarray(meta[key], dtype=float) + shift
+    spacing[:axes] *= scale
+    meta['ElementSpacing'] = spacing
+    if 'ElementSize' in meta:
+        meta['ElementSize'] = np.array(meta['ElementSize'], dtype=float)
+        meta['ElementSize'][:axes] *= scale
+    return meta
+
+
+def _downsample(image, factor, axes):
+    # average blocks of factor voxels along the leading axes, repeating edge voxels to complete partial blocks
+    image = np.pad(image, [(0, -n % factor if i < axes else 0) for i, n in enumerate(image.shape)], mode='edge')
+    shape = []
+    for i, n in enumerate(image.shape):
+        shape += [n // factor, factor] if i < axes else [n]
+    return image.reshape(shape).mean(axis=tuple(2 * i + 1 for i in range(axes)), dtype=np.float64)
+
+
+def _cast(image, dtype):
+    if np.issubdtype(dtype, np.integer):
+        image = np.rint(image)
+    return image.astype(dtype)
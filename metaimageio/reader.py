@@ -1,216 +1,543 @@
-import contextlib
-import io
+import collections
+import concurrent.futures
+import contextvars
+import functools
+import itertools
+import json
+import math
+import operator
+import os
 import pathlib
-import shlex
-import zlib
 
 import numpy as np
 
-# https://itk.org/Wiki/ITK/MetaIO/Documentation#Reference:_Tags_of_MetaImage
-TAGS = (
-    'Comment',                  # MET_STRING
-    'ObjectType',               # MET_STRING (Image)
-    'ObjectSubType',            # MET_STRING
-    'TransformType',            # MET_STRING (Rigid)
-    'NDims',                    # MET_INT
-    'Name',                     # MET_STRING
-    'ID',                       # MET_INT
-    'ParentID',                 # MET_INT
-    'CompressedData',           # MET_STRING (boolean)
-    'CompressedDataSize',       # MET_INT
-    'BinaryData',               # MET_STRING (boolean)
-    'BinaryDataByteOrderMSB',   # MET_STRING (boolean)
-    'ElementByteOrderMSB',      # MET_STRING (boolean)
-    'Color',                    # MET_FLOAT_ARRAY[4]
-    'Position',                 # MET_FLOAT_ARRAY[NDims]
-    'Offset',                   # == Position
-    'Origin',                   # == Position
-    'Orientation',              # MET_FLOAT_MATRIX[NDims][NDims]
-    'Rotation',                 # == Orientation
-    'TransformMatrix',          # == Orientation
-    'CenterOfRotation',         # MET_FLOAT_ARRAY[NDims]
-    'AnatomicalOrientation',    # MET_STRING (RAS)
-    'ElementSpacing',           # MET_FLOAT_ARRAY[NDims]
-    'DimSize',                  # MET_INT_ARRAY[NDims]
-    'HeaderSize',               # MET_INT
-    'HeaderSizePerSlice',       # MET_INT (non-standard tag for handling per slice header)
-    'HeaderSizesPerDataFile',   # MET_INT_ARRAY[NDataFile] (non-standard tag for handling variable per ElementDataFile header)
-    'Modality',                 # MET_STRING (MET_MOD_CT)
-    'SequenceID',               # MET_INT_ARRAY[4]
-    'ElementMin',               # MET_FLOAT
-    'ElementMax',               # MET_FLOAT
-    'ElementNumberOfChannels',  # MET_INT
-    'ElementSize',              # MET_FLOAT_ARRAY[NDims]
-    'ElementType',              # MET_STRING (MET_UINT)
-    'ElementDataFile')          # MET_STRING
-
-TYPES = {
-    'MET_CHAR': np.int8,
-    'MET_UCHAR': np.uint8,
-    'MET_SHORT': np.int16,
-    'MET_USHORT': np.uint16,
-    'MET_INT': np.int32,
-    'MET_UINT': np.uint32,
-    'MET_LONG': np.int64,
-    'MET_ULONG': np.uint64,
-    'MET_FLOAT': np.float32,
-    'MET_DOUBLE': np.float64}
-
-
-def read(filepath, slices=None, memmap=False):
-    filepath = pathlib.Path(filepath)
+from . import compression, header
+from .header import TAGS, TYPES  # noqa: F401
+from .stats import phase
 
-    # read metadata from file
-    meta_in = {}
-    meta_size = 0
-    islist = False
-    islocal = False
-    with filepath.open('rb') as f:
-        for line in f:
-            line = line.decode()
-            meta_size += len(line)
-            # skip empty and commented lines
-            if not line or line.startswith('#'):
-                continue
-            key = line.split('=', 1)[0].strip()
-            value = line.split('=', 1)[-1].strip()
-            # handle case variations
-            with contextlib.suppress(ValueError):
-                key = TAGS[[x.upper() for x in TAGS].index(key.upper())]
-            meta_in[key] = value
-            # handle supported ElementDataFile formats
-            if islist:
-                meta_in['ElementDataFile'].append(line.strip())
-            elif key == 'ElementDataFile' and value.upper() == 'LIST':
-                meta_in['ElementDataFile'] = []
-                islist = True
-            elif key == 'ElementDataFile' and value.upper() == 'LOCAL':
-                meta_in['ElementDataFile'] = [str(filepath)]
-                islocal = True
-                break
-            elif key == 'ElementDataFile' and '%' in value:
-                args = shlex.split(value)
-                meta_in['ElementDataFile'] = [args[0] % i for i in range(int(args[1]), int(args[2]) + int(args[3]), int(args[3]))]
-            elif key == 'ElementDataFile':
-                meta_in['ElementDataFile'] = [value]
-
-    # typecast metadata to native types
-    meta = dict.fromkeys(TAGS, None)
-    for key, value in meta_in.items():
-        if key in ('Comment', 'ObjectType', 'ObjectSubType', 'TransformType', 'Name', 'AnatomicalOrientation', 'Modality', 'ElementDataFile'):
-            meta[key] = value
-        elif key in ('NDims', 'ID', 'ParentID', 'CompressedDataSize', 'HeaderSize', 'HeaderSizePerSlice', 'ElementNumberOfChannels'):
-            # skip header if size is -1 (https://github.com/Kitware/MetaIO/blob/56c9257467fa901e51e67ca5934711869ed84e49/src/metaImage.cxx#L2606)
-            if key == 'HeaderSize' and int(value) == -1:
-                value = 0
-            meta[key] = int(value)
-        elif key in ('CompressedData', 'BinaryData', 'BinaryDataByteOrderMSB', 'ElementByteOrderMSB'):
-            meta[key] = value.upper() == 'TRUE'
-        elif key in ('Color', 'Position', 'Offset', 'Origin', 'CenterOfRotation', 'ElementSpacing', 'ElementSize'):
-            meta[key] = np.array(value.split(), dtype=float)
-        elif key in ('Orientation', 'Rotation', 'TransformMatrix'):
-            meta[key] = np.array(value.split(), dtype=float).reshape(3, 3).transpose()
-        elif key in ('DimSize', 'HeaderSizesPerDataFile', 'SequenceID'):
-            meta[key] = np.array(value.split(), dtype=int)
-        elif key in ('ElementMin', 'ElementMax'):
-            meta[key] = float(value)
-        elif key == 'ElementType':
-            try:
-                meta[key] = [x[1] for x in TYPES.items() if x[0] == value.upper()][0]
-            except IndexError as exception:
-                raise ValueError(f'ElementType "{value}" is not supported') from exception
-        else:
-            meta[key] = value
+CHUNK_SIZE = 2 ** 24
+GAP_SIZE = 2 ** 16
+HEADER_CACHE_SIZE = 1024
+MAX_BYTES = 2 ** 30
+READ_SIZE = 2 ** 30
+SPAN_SIZE = 2 ** 24
+
+_STATS = contextvars.ContextVar('stats', default=None)
+
+
+def read_header(filepath):
+    meta, _, _ = _read_header(pathlib.Path(filepath))
+    return _clean(meta)
+
+
+def set_header_cache_size(maxsize=HEADER_CACHE_SIZE):
+    global _read_header_cached
+    _read_header_cached = functools.lru_cache(maxsize=maxsize)(_read_header_cached.__wrapped__)
+
+
+def read(filepath, slices=None, memmap=False, workers=1, stats=None, roi=None, level=None, cache=None, out=None, dtype=None, scale=None, offset=None):
+    filepath = pathlib.Path(filepath)
+    if level:
+        filepath = _level_path(filepath, level)
+    with phase(stats, 'header'):
+        meta, datapaths, start = _read_header(filepath, stats)
 
     # read image from file
-    shape = meta['DimSize'].copy()[::-1]
-    if (meta.get('ElementNumberOfChannels') or 1) > 1:
-        shape = np.append(shape, meta['ElementNumberOfChannels'])
-    element_size = np.dtype(meta['ElementType']).itemsize
-    if memmap:
-        if meta.get('BinaryDataByteOrderMSB') or meta.get('ElementByteOrderMSB'):
-            raise ValueError('ByteOrderMSB is not supported with memmap')
-        if meta.get('CompressedData'):
-            raise ValueError('CompressedData is not supported with memmap')
-        if meta['HeaderSizePerSlice'] is not None:
-            raise ValueError('HeaderSizePerSlice is not supported with memmap')
-        if meta['HeaderSizesPerDataFile'] is not None:
-            raise ValueError('HeaderSizesPerDataFile is not supported with memmap')
-        if len(meta['ElementDataFile']) != 1:
-            raise ValueError('Only single ElementDataFile is supported with memmap')
+    shape = list(_shape(meta))
+    convert = dtype is not None or scale is not None or offset is not None
+    if memmap and (out is not None or convert):
+        raise ValueError('Out, dtype, scale and offset are not supported with memmap')
+    if cache is not None:
+        from .cache import DiskCache  # cache imports reader
+        if not memmap or not isinstance(cache, DiskCache):
+            raise ValueError('Cache must be a cache.DiskCache and is only supported with memmap')
+    if convert and dtype is None:
+        dtype = np.result_type(meta['ElementType'], *(x for x in (scale, offset) if x is not None))
+    if roi is not None:
+        if slices is not None:
+            raise ValueError('Slices and roi cannot be used together')
+        region = _check_roi(roi, shape)
+        if memmap:
+            image = _memmap_image(filepath, meta, datapaths, start, cache=cache)[tuple(slice(x.start, x.stop) for x in region)]
+        elif convert:
+            image = _allocate(out, [len(x) for x in region], dtype)
+            _read_converted(meta, datapaths, start, region, image, scale, offset, workers, stats)
+        else:
+            image = _read_region(meta, datapaths, start, region, workers, stats, _allocate(out, [len(x) for x in region], meta['ElementType']))
+    elif memmap:
         if slices is not None:
-            raise ValueError('Specifying slices is not supported with memmap')
-        datapath = pathlib.Path(meta['ElementDataFile'][0])
-        if filepath != datapath and not datapath.is_absolute():
-            datapath = filepath.parent / datapath
-        offset = 0
-        if islocal:
-            offset += meta_size
-        offset += meta.get('HeaderSize') or 0
-        image = np.memmap(datapath, dtype=meta['ElementType'], mode='c', offset=offset, shape=tuple(shape))
+            slices = _check_slices(slices, shape[0])
+        image = None
+        if slices is None or slices:
+            image = _memmap_image(filepath, meta, datapaths, start, slices, cache)
     else:
-        increment = np.prod(shape[1:], dtype=np.uintp) * np.uintp(element_size)
-        if slices is None:
-            slices = range(shape[0])
-        slices = tuple(slices)
-        if np.any(np.diff(slices) <= 0):
-            raise ValueError('Slices must be strictly increasing')
-        if slices and (slices[0] < 0 or slices[-1] >= shape[0]):
-            raise ValueError('Slices must be bounded by z dimension')
-        if len(meta['ElementDataFile']) > 1:
-            shape[0] = 1
-        data = io.BytesIO()
-
-        for i, datapath in enumerate(meta['ElementDataFile']):
-            datapath = pathlib.Path(datapath)
-            if filepath != datapath and not datapath.is_absolute():
-                datapath = filepath.parent / datapath
-            with datapath.open('rb') as f:
-                if islocal:
-                    f.seek(meta_size, 1)
-                f.seek((meta.get('HeaderSize') or 0), 1)
-                if meta['HeaderSizesPerDataFile'] is not None:
-                    f.seek(meta['HeaderSizesPerDataFile'][i], 1)
-                if meta.get('CompressedData'):
-                    if meta['CompressedDataSize'] is None:
-                        raise ValueError('CompressedDataSize needs to be specified when using CompressedData')
-                    if meta['HeaderSizePerSlice'] is not None:
-                        raise ValueError('HeaderSizePerSlice is not supported with compressed images')
-                    if len(meta['ElementDataFile']) == 1 and slices != tuple(range(shape[0])):
-                        raise ValueError('Specifying slices with compressed images is not supported')
-                    data.write(zlib.decompress(f.read(meta['CompressedDataSize'])))
-                else:
-                    read, seek = np.uintp(0), np.uintp(0)
-                    for j in range(shape[0]):
-                        if meta['HeaderSizePerSlice'] is not None:
-                            data.write(f.read(read))
-                            read = np.uintp(0)
-                            seek += np.uintp(meta['HeaderSizePerSlice'])
-                        if (len(meta['ElementDataFile']) == 1 and j in slices) or (len(meta['ElementDataFile']) > 1 and i in slices):
-                            f.seek(seek, 1)
-                            seek = np.uintp(0)
-                            read += increment
-                            if read > np.iinfo(np.uintp).max - increment:
-                                data.write(f.read(read))
-                                read = np.uintp(0)
-                        else:
-                            data.write(f.read(read))
-                            read = np.uintp(0)
-                            seek += increment
-                            if seek > np.iinfo(np.uintp).max - increment:
-                                f.seek(seek, 1)
-                                seek = np.uintp(0)
-                    data.write(f.read(read))
+        slices = _check_slices(slices, shape[0])
+        _check_compression(meta, datapaths)
+        image = None
         if slices:
             shape[0] = len(slices)
-            image = np.frombuffer(data.getbuffer(), dtype=meta['ElementType']).reshape(shape)
-            if meta.get('BinaryDataByteOrderMSB') or meta.get('ElementByteOrderMSB'):
-                image.byteswap(inplace=True)
-        else:
-            image = None
+            if convert:
+                image = _allocate(out, shape, dtype)
+                _read_converted(meta, datapaths, start, (slices, *(range(x) for x in shape[1:])), image, scale, offset, workers, stats)
+            else:
+                image = _allocate(out, shape, meta['ElementType'])
+                _read_slabs(meta, datapaths, start, image, slices, workers, stats)
+
+    return image, _clean(meta)
+
+
+def read_many(filepaths, slices=None, memmap=False, workers=None, ordered=True, max_bytes=MAX_BYTES, stats=None, out=None):
+    # read files in a thread pool while bounding the number of bytes and files in flight
+    if out is not None and not callable(out):
+        raise ValueError('Out must be a function allocating an array given shape and dtype when reading many files')
+    workers = workers or min(32, (os.cpu_count() or 1) + 4)
+    with concurrent.futures.ThreadPoolExecutor(workers) as executor:
+        filepaths = iter(filepaths)
+        headers, pending, sizes = collections.deque(), [], {}
+        try:
+            while True:
+                # estimate sizes from headers parsed ahead in the pool, before applying the byte budget
+                for filepath in itertools.islice(filepaths, 2 * workers - len(headers)):
+                    headers.append((filepath, executor.submit(_nbytes, filepath, slices, memmap)))
+                if not headers:
+                    break
+                filepath, size = headers.popleft()
+                size = size.result()
+                while pending and (len(pending) >= 2 * workers or sum(sizes.values()) + size > max_bytes):
+                    future = _pop(pending, ordered)
+                    sizes.pop(future)
+                    yield future.result()
+                future = executor.submit(_read_many, filepath, slices, memmap, stats, out)
+                pending.append(future)
+                sizes[future] = size
+            while pending:
+                yield _pop(pending, ordered).result()
+        finally:
+            for future in (*pending, *(x[1] for x in headers)):
+                future.cancel()
+
+
+def _pyramid_path(filepath):
+    return filepath.with_name(f'{filepath.stem}.pyramid.json')
+
+
+def _read_pyramid(filepath):
+    # index of downsampled levels, ignored once the image has changed since they were written
+    try:
+        index = json.loads(_pyramid_path(filepath).read_text())
+    except FileNotFoundError:
+        return None
+    stat = filepath.stat()
+    if index['mtime_ns'] != stat.st_mtime_ns or index['size'] != stat.st_size:
+        return None
+    return index
+
+
+def _level_path(filepath, level):
+    index = _read_pyramid(filepath)
+    if index is None:
+        raise ValueError(f'No up to date pyramid found for "{filepath.name}"')
+    if not 0 < level <= len(index['levels']):
+        raise ValueError(f'Level must be between 0 and {len(index["levels"])}')
+    return filepath.parent / index['levels'][level - 1]['file']
+
+
+def _nbytes(filepath, slices, memmap):
+    # mapped images are not counted against the byte budget
+    if memmap:
+        return 0
+    meta, _, _ = _read_header(pathlib.Path(filepath))
+    shape = _shape(meta)
+    size = math.prod(shape) * np.dtype(meta['ElementType']).itemsize
+    if slices is not None and shape[0]:
+        size = size // shape[0] * len(slices)
+    return size
+
+
+def _read_many(filepath, slices, memmap, stats=None, out=None):
+    image, meta = read(filepath, slices=slices, memmap=memmap, stats=stats, out=out)
+    return filepath, image, meta
+
+
+def _pop(pending, ordered):
+    if ordered:
+        return pending.pop(0)
+    done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+    future = next(iter(done))
+    pending.remove(future)
+    return future
+
+
+def _memmap_image(filepath, meta, datapaths, offset, slices=None, cache=None):
+    if not meta.get('CompressedData'):
+        return _memmap(meta, datapaths, offset, slices)
+    if cache is None:
+        raise ValueError('CompressedData is not supported with memmap, use a cache.DiskCache to map a decompressed copy')
+    image, _ = cache.read(filepath)
+    return image if slices is None else _take(image, slices)
+
+
+def _memmap(meta, datapaths, offset, slices=None):
+    shape = _shape(meta)
+    dtype = _dtype(meta)
+    header_size_per_slice = meta['HeaderSizePerSlice'] or 0
+    offset += meta.get('HeaderSize') or 0
+    if len(datapaths) > 1:
+        # map each ElementDataFile separately and stack them virtually
+        images = []
+        for j in range(shape[0]) if slices is None else slices:
+            offset_j = offset + header_size_per_slice
+            if meta['HeaderSizesPerDataFile'] is not None:
+                offset_j += int(meta['HeaderSizesPerDataFile'][j])
+            images.append(np.memmap(datapaths[j], dtype=dtype, mode='c', offset=offset_j, shape=shape[1:]))
+        return MemmapStack(images)
+    if meta['HeaderSizesPerDataFile'] is not None:
+        offset += int(meta['HeaderSizesPerDataFile'][0])
+    if header_size_per_slice:
+        # skip per slice headers using a strided view
+        increment = dtype.itemsize * math.prod(shape[1:])
+        buffer = np.memmap(datapaths[0], dtype=np.uint8, mode='c', offset=offset, shape=(shape[0] * (header_size_per_slice + increment),))
+        strides = (header_size_per_slice + increment, *(dtype.itemsize * math.prod(shape[i + 1:]) for i in range(1, len(shape))))
+        image = np.ndarray(shape, dtype=dtype, buffer=buffer, offset=header_size_per_slice, strides=strides)
+    else:
+        image = np.memmap(datapaths[0], dtype=dtype, mode='c', offset=offset, shape=shape)
+    return image if slices is None else _take(image, slices)
+
+
+def _take(image, slices):
+    # select slices of a mapped image, as a view where they are evenly spaced
+    if len(set(np.diff(slices).tolist())) <= 1:
+        step = slices[1] - slices[0] if len(slices) > 1 else 1
+        return image[slices[0]:slices[-1] + 1:step]
+    return MemmapStack(image[j] for j in slices)
+
+
+class MemmapStack:
+
+    def __init__(self, images):
+        self.images = list(images)
+        self.shape = (len(self.images), *self.images[0].shape)
+        self.dtype = self.images[0].dtype
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __array__(self, dtype=None, copy=None):
+        _ = copy
+        image = self[...]
+        return image if dtype is None else image.astype(dtype, copy=False)
+
+    def __getitem__(self, index):
+        # materialize only the slices selected along the first axis
+        if not isinstance(index, tuple):
+            index = (index,)
+        first, rest = (index[0], index[1:]) if index else (slice(None), ())
+        if first is Ellipsis:
+            first, rest = slice(None), index
+        if not isinstance(first, slice):
+            return np.asarray(self.images[operator.index(first)][rest])
+        images = [self.images[j][rest] for j in range(*first.indices(len(self)))]
+        if not images:
+            return np.empty((0, *np.shape(self.images[0][rest])), dtype=self.dtype)
+        return np.stack(images)
+
+
+def _shape(meta):
+    shape = tuple(int(x) for x in meta['DimSize'][::-1])
+    if (meta.get('ElementNumberOfChannels') or 1) > 1:
+        shape += (meta['ElementNumberOfChannels'],)
+    return shape
+
+
+def _dtype(meta):
+    # data type as stored on disk
+    dtype = np.dtype(meta['ElementType'])
+    if meta.get('BinaryDataByteOrderMSB') or meta.get('ElementByteOrderMSB'):
+        dtype = dtype.newbyteorder('>')
+    return dtype
+
 
+def _clean(meta):
     # remove unused metadata
-    meta['ElementDataFile'] = None
-    meta = {x: y for x, y in meta.items() if y is not None}
+    return {x: y for x, y in meta.items() if y is not None and x != 'ElementDataFile'}
+
+
+def _check_slices(slices, n):
+    slices = tuple(range(n) if slices is None else slices)
+    if np.any(np.diff(slices) <= 0):
+        raise ValueError('Slices must be strictly increasing')
+    if slices and (slices[0] < 0 or slices[-1] >= n):
+        raise ValueError('Slices must be bounded by z dimension')
+    return slices
+
+
+def _allocate(out, shape, dtype):
+    # out is either an array to read into or a function allocating one given shape and dtype
+    shape, dtype = tuple(shape), np.dtype(dtype)
+    if out is None:
+        return np.empty(shape, dtype=dtype)
+    image = out(shape, dtype) if callable(out) else out
+    if not isinstance(image, np.ndarray) or image.shape != shape or image.dtype != dtype or not image.flags.c_contiguous or not image.flags.writeable:
+        raise ValueError(f'Out must be a writeable C contiguous array of shape {shape} and dtype {dtype}')
+    return image
+
+
+def _read_converted(meta, datapaths, start, region, image, scale=None, offset=None, workers=1, stats=None):
+    # read chunks of slices in their on disk byte order and cast them into image, without a full size intermediate
+    if not image.size:
+        return
+    shape = _shape(meta)
+    dtype = _dtype(meta)
+    if meta.get('CompressedData') or all(len(x) == n for x, n in zip(region[1:], shape[1:])):
+        size = max(1, CHUNK_SIZE // max(1, dtype.itemsize * math.prod(shape[1:])))
+        crop = (slice(None), *(slice(x.start, x.stop, x.step) for x in region[1:]))
+        chunks = (x[crop] for x in _iter_slabs(meta, datapaths, start, tuple(region[0]), size, dtype, workers, stats))
+    else:
+        size = max(1, CHUNK_SIZE // max(1, dtype.itemsize * math.prod(len(x) for x in region[1:])))
+        chunks = (
+            _read_region(meta, datapaths, start, (region[0][k:k + size], *region[1:]), workers, stats, np.empty((len(region[0][k:k + size]), *(len(x) for x in region[1:])), dtype=dtype))
+            for k in range(0, len(region[0]), size))
+    k = 0
+    for chunk in chunks:
+        with phase(stats, 'astype'):
+            _convert(chunk, image[k:k + len(chunk)], scale, offset)
+        k += len(chunk)
+
+
+def _convert(image, out, scale=None, offset=None):
+    # rescale in floating point and cast once into the output dtype
+    if scale is not None or offset is not None:
+        image = np.multiply(image, 1 if scale is None else scale, dtype=np.float64)
+        if offset is not None:
+            image += offset
+    np.copyto(out, image, casting='unsafe')
+
+
+def _check_roi(roi, shape):
+    # ranges along the leading axes given as (start, stop) pairs, or None for a whole axis
+    if len(roi) > len(shape):
+        raise ValueError('Roi has more axes than the image')
+    region = []
+    for x, n in zip((*roi, *(None,) * (len(shape) - len(roi))), shape):
+        start, stop = (0, n) if x is None else (int(x[0]), int(x[1]))
+        if not 0 <= start <= stop <= n:
+            raise ValueError('Roi must be bounded by the image dimensions')
+        region.append(range(start, stop))
+    return tuple(region)
+
+
+def _check_compression(meta, datapaths):
+    if meta.get('CompressedData'):
+        if meta['CompressedDataSize'] is None:
+            raise ValueError('CompressedDataSize needs to be specified when using CompressedData')
+        if meta['HeaderSizePerSlice'] is not None:
+            raise ValueError('HeaderSizePerSlice is not supported with compressed images')
+        if meta['CompressedBlockSizes'] is not None and len(datapaths) != 1:
+            raise ValueError('Only single ElementDataFile is supported with CompressedBlockSizes')
+
+
+def _read_header(filepath, stats=None):
+    # parse each file once per identity and return copies that callers are free to modify
+    stat = filepath.stat()
+    # stats are not part of the cache key, only files read on a miss are counted
+    token = _STATS.set(stats)
+    try:
+        meta, datapaths, offset = _read_header_cached(str(filepath.absolute()), stat.st_mtime_ns, stat.st_size, stat.st_ino)
+    finally:
+        _STATS.reset(token)
+    meta = {x: y.copy() if isinstance(y, (list, np.ndarray)) else y for x, y in meta.items()}
+    return meta, list(datapaths), offset
+
+
+@functools.lru_cache(maxsize=HEADER_CACHE_SIZE)
+def _read_header_cached(filepath, mtime, size, inode):
+    _ = mtime, size, inode
+    return header.read(pathlib.Path(filepath), _STATS.get())
+
+
+def _read_slabs(meta, datapaths, offset, image, slices, workers=1, stats=None):
+    args = [(datapaths[0], meta, offset, 0, image, slices, stats)]
+    if len(datapaths) > 1:
+        args = [(datapaths[j], meta, offset, j, image[k:k + 1], (0,), stats) for k, j in enumerate(slices)]
+    if len(args) > 1 and workers > 1:
+        # read ElementDataFiles concurrently into their slots of the image
+        with concurrent.futures.ThreadPoolExecutor(workers) as executor:
+            for future in [executor.submit(_read_file, *x) for x in args]:
+                future.result()
+    else:
+        for x in args:
+            _read_file(*x)
+    if not _dtype(meta).isnative and image.dtype.isnative:
+        with phase(stats, 'byteswap'):
+            image.byteswap(inplace=True)
+
+
+def _read_region(meta, datapaths, offset, region, workers=1, stats=None, image=None):
+    # read a region, given as ascending ranges along each axis, using coalesced byte range reads
+    shape = _shape(meta)
+    if image is None:
+        image = np.empty([len(x) for x in region], dtype=meta['ElementType'])
+    if not image.size:
+        return image
+    if meta.get('CompressedData'):
+        _check_compression(meta, datapaths)
+        slab = np.empty((len(region[0]), *shape[1:]), dtype=meta['ElementType'])
+        _read_slabs(meta, datapaths, offset, slab, tuple(region[0]), workers, stats)
+        image[...] = slab[(slice(None), *(slice(x.start, x.stop, x.step) for x in region[1:]))]
+        return image
+    if len(shape) == 1:
+        shape, region = (*shape, 1), (*region, range(1))
+    dtype = _dtype(meta)
+    itemsize = dtype.itemsize
+    # byte offsets of rows along the last axis relative to the start of an outermost slice
+    strides = [itemsize * math.prod(shape[i + 1:]) for i in range(len(shape))]
+    rows = np.zeros(1, dtype=np.int64)
+    for i in range(1, len(shape) - 1):
+        rows = (rows[:, None] + np.asarray(region[i], dtype=np.int64) * strides[i]).ravel()
+    rows += region[-1].start * itemsize
+    step = region[-1].step * itemsize
+    length = (len(region[-1]) - 1) * step + itemsize
+    image_rows = image.reshape(len(region[0]), len(rows), len(region[-1]))
+    header_size_per_slice = meta['HeaderSizePerSlice'] or 0
+    start = offset + (meta.get('HeaderSize') or 0)
+    if len(datapaths) > 1:
+        for k, j in enumerate(region[0]):
+            starts = start + header_size_per_slice + rows
+            if meta['HeaderSizesPerDataFile'] is not None:
+                starts += int(meta['HeaderSizesPerDataFile'][j])
+            with _open(datapaths[j], stats) as f:
+                _read_rows(f, starts, length, step, image_rows[k], dtype, stats)
+    else:
+        if meta['HeaderSizesPerDataFile'] is not None:
+            start += int(meta['HeaderSizesPerDataFile'][0])
+        slice_starts = start + header_size_per_slice + np.asarray(region[0], dtype=np.int64) * (strides[0] + header_size_per_slice)
+        starts = (slice_starts[:, None] + rows).ravel()
+        with _open(datapaths[0], stats) as f:
+            _read_rows(f, starts, length, step, image_rows.reshape(-1, len(region[-1])), dtype, stats)
+    return image
+
+
+def _read_rows(f, starts, length, step, image, dtype, stats=None):
+    # group nearby rows that are aligned to each other and read each group, bounded in size, at once
+    ends = starts + length
+    breaks = np.flatnonzero((starts[1:] - ends[:-1] > GAP_SIZE) | ((starts[1:] - starts[:-1]) % dtype.itemsize != 0)) + 1
+    bounds = (0, *breaks.tolist(), len(starts))
+    for k0, k1 in zip(bounds[:-1], bounds[1:]):
+        while k0 < k1:
+            k = max(k0 + 1, k0 + int(np.searchsorted(ends[k0:k1], starts[k0] + SPAN_SIZE, side='right')))
+            _read_span(f, starts[k0:k], length, step, image[k0:k], dtype, stats)
+            k0 = k
+
+
+def _read_span(f, starts, length, step, image, dtype, stats=None):
+    f.seek(int(starts[0]))
+    size = int(starts[-1] - starts[0]) + length
+    if step == dtype.itemsize and size == image.nbytes:
+        # rows are contiguous both on disk and in memory
+        _readinto(f, image)
+        if not dtype.isnative and image.dtype.isnative:
+            with phase(stats, 'byteswap'):
+                image.byteswap(inplace=True)
+        return
+    buffer = np.empty(size, dtype=np.uint8)
+    _readinto(f, buffer)
+    index = (starts - starts[0])[:, None] // dtype.itemsize + np.arange(image.shape[1]) * (step // dtype.itemsize)
+    with phase(stats, 'byteswap' if not dtype.isnative else 'gather'):
+        image[...] = buffer.view(dtype)[index]
+
+
+def _read_file(datapath, meta, offset, index, image, slices, stats=None):
+    with _open(datapath, stats) as f:
+        _read_data(f, meta, offset, index, image, slices, stats)
+
+
+def _open(datapath, stats=None):
+    return datapath.open('rb') if stats is None else stats.open(datapath)
+
+
+def _iter_slabs(meta, datapaths, offset, slices, size=1, dtype=None, workers=1, stats=None):
+    # yield slabs of up to size slices, reading sequentially from a single handle where possible
+    _check_compression(meta, datapaths)
+    shape = _shape(meta)
+    dtype = np.dtype(meta['ElementType'] if dtype is None else dtype)
+    batches = [slices[i:i + size] for i in range(0, len(slices), size)]
+    if len(datapaths) > 1 or meta['CompressedBlockSizes'] is not None:
+        for batch in batches:
+            image = np.empty((len(batch), *shape[1:]), dtype=dtype)
+            _read_slabs(meta, datapaths, offset, image, batch, workers, stats)
+            yield image
+        return
+    with _open(datapaths[0], stats) as f:
+        _seek_data(f, meta, offset, 0)
+        stream = _decompress(f, meta['CompressedDataSize'], meta['CompressedDataCodec'], stats) if meta.get('CompressedData') else f
+        position = 0
+        for batch in batches:
+            image = np.empty((len(batch), *shape[1:]), dtype=dtype)
+            _read_slices(stream, image, tuple(x - position for x in batch), meta['HeaderSizePerSlice'])
+            if not _dtype(meta).isnative and dtype.isnative:
+                with phase(stats, 'byteswap'):
+                    image.byteswap(inplace=True)
+            position = batch[-1] + 1
+            yield image
+
+
+def _seek_data(f, meta, offset, index):
+    # seek past headers preceding the data of the index-th ElementDataFile
+    offset += meta.get('HeaderSize') or 0
+    if meta['HeaderSizesPerDataFile'] is not None:
+        offset += int(meta['HeaderSizesPerDataFile'][index])
+    f.seek(offset)
+    return offset
+
+
+def _read_data(f, meta, offset, index, image, slices, stats=None):
+    offset = _seek_data(f, meta, offset, index)
+    if not meta.get('CompressedData'):
+        _read_slices(f, image, slices, meta['HeaderSizePerSlice'])
+    elif meta['CompressedBlockSizes'] is None:
+        _read_slices(_decompress(f, meta['CompressedDataSize'], meta['CompressedDataCodec'], stats), image, slices)
+    else:
+        # decompress only the blocks that contain requested slices
+        step = meta['CompressedBlockSlices']
+        sizes = meta['CompressedBlockSizes']
+        offsets = offset + np.concatenate(([0], np.cumsum(sizes)))
+        slices = np.asarray(slices)
+        for block in np.unique(slices // step):
+            k0, k1 = np.searchsorted(slices, (block * step, (block + 1) * step))
+            f.seek(int(offsets[block]))
+            _read_slices(_decompress(f, int(sizes[block]), meta['CompressedDataCodec'], stats), image[k0:k1], slices[k0:k1] - block * step)
+
+
+def _decompress(f, size, codec=None, stats=None):
+    stream = compression.DecompressReader(f, size, codec=codec)
+    return stream if stats is None else stats.wrap(stream, 'decompress')
+
+
+def _read_slices(f, image, slices, header_size_per_slice=None):
+    # read strictly increasing slices into image, coalescing consecutive slices into a single read
+    header_size_per_slice = header_size_per_slice or 0
+    increment = image[0].nbytes
+    position, k = 0, 0
+    while k < len(slices):
+        n = 1
+        if not header_size_per_slice:
+            while k + n < len(slices) and slices[k + n] == slices[k] + n:
+                n += 1
+        skip = (slices[k] - position) * (increment + header_size_per_slice) + header_size_per_slice
+        if skip:
+            f.seek(skip, 1)
+        _readinto(f, image[k:k + n])
+        position, k = slices[k] + n, k + n
+
 
-    return image, meta
+def _readinto(f, image):
+    buffer = memoryview(image.reshape(-1).view(np.uint8))
+    while buffer:
+        n = f.readinto(buffer[:READ_SIZE])
+        if not n:
+            raise ValueError('ElementDataFile is shorter than expected from DimSize and ElementType')
+        buffer = buffer[n:]
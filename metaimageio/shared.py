@@ -0,0 +1,57 @@
+import math
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from . import reader
+
+
+def read(filepath, **kwargs):
+    # decode into a new shared memory block and return a (name, shape, dtype, meta) handle that is cheap to pass between processes
+    blocks = []
+
+    def allocate(shape, dtype):
+        block = shared_memory.SharedMemory(create=True, size=max(1, math.prod(shape) * dtype.itemsize))
+        blocks.append(block)
+        return np.ndarray(shape, dtype=dtype, buffer=block.buf)
+
+    try:
+        image, meta = reader.read(filepath, out=allocate, **kwargs)
+    except BaseException:
+        for block in blocks:
+            block.close()
+            block.unlink()
+        raise
+    if image is None:
+        return None, None, None, meta
+    handle = blocks[0].name, image.shape, image.dtype.str, meta
+    del image
+    blocks[0].close()
+    return handle
+
+
+class SharedImage:
+    # attach to the block of a handle, unlinking it on close unless asked otherwise
+
+    def __init__(self, handle):
+        name, shape, dtype, self.meta = handle
+        self.image = None
+        self._block = None
+        if name is not None:
+            self._block = shared_memory.SharedMemory(name=name)
+            self.image = np.ndarray(shape, dtype=dtype, buffer=self._block.buf)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self, unlink=True):
+        self.image = None
+        if self._block is None:
+            return
+        self._block.close()
+        if unlink:
+            self._block.unlink()
+        self._block = None
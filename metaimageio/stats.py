@@ -0,0 +1,142 @@
+import collections
+import contextlib
+import threading
+import time
+
+
+class Stats:
+
+    def __init__(self):
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.reads = 0
+        self.writes = 0
+        self.seeks = 0
+        self.files_opened = 0
+        self.times = collections.defaultdict(float)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def as_dict(self):
+        return {
+            'bytes_read': self.bytes_read,
+            'bytes_written': self.bytes_written,
+            'reads': self.reads,
+            'writes': self.writes,
+            'seeks': self.seeks,
+            'files_opened': self.files_opened,
+            'times': dict(self.times)}
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        # time spent in nested phases is only accounted to the innermost one, per thread
+        stack = self._local.__dict__.setdefault('stack', [])
+        stack.append([time.perf_counter(), 0.0])
+        try:
+            yield
+        finally:
+            start, nested = stack.pop()
+            elapsed = time.perf_counter() - start
+            if stack:
+                stack[-1][1] += elapsed
+            with self._lock:
+                self.times[name] += elapsed - nested
+
+    def open(self, path, mode='rb'):
+        f = path.open(mode)
+        self.count(files_opened=1)
+        return File(f, self)
+
+    def wrap(self, f, name):
+        return Reader(f, self, name)
+
+    def iterate(self, iterable, name):
+        iterator = iter(iterable)
+        while True:
+            with self.phase(name):
+                x = next(iterator, None)
+            if x is None:
+                return
+            yield x
+
+    def count(self, **kwargs):
+        with self._lock:
+            for key, value in kwargs.items():
+                setattr(self, key, getattr(self, key) + value)
+
+
+def phase(stats, name):
+    return contextlib.nullcontext() if stats is None else stats.phase(name)
+
+
+class File:
+    # file wrapper counting calls and bytes transferred and timing them as io
+
+    def __init__(self, f, stats):
+        self._f = f
+        self._stats = stats
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __getattr__(self, name):
+        return getattr(self._f, name)
+
+    def read(self, size=-1):
+        with self._stats.phase('io'):
+            data = self._f.read(size)
+        self._stats.count(reads=1, bytes_read=len(data))
+        return data
+
+    def readinto(self, buffer):
+        with self._stats.phase('io'):
+            n = self._f.readinto(buffer)
+        self._stats.count(reads=1, bytes_read=n or 0)
+        return n
+
+    def seek(self, offset, whence=0):
+        with self._stats.phase('io'):
+            position = self._f.seek(offset, whence)
+        self._stats.count(seeks=1)
+        return position
+
+    def write(self, data):
+        with self._stats.phase('io'):
+            n = self._f.write(data)
+        self._stats.count(writes=1, bytes_written=n)
+        return n
+
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+
+    def close(self):
+        with self._stats.phase('io'):
+            self._f.close()
+
+
+class Reader:
+    # stream wrapper timing reads, excluding the io of the wrapped file, under the given phase
+
+    def __init__(self, f, stats, name):
+        self._f = f
+        self._stats = stats
+        self._name = name
+
+    def __getattr__(self, name):
+        return getattr(self._f, name)
+
+    def read(self, size=-1):
+        with self._stats.phase(self._name):
+            return self._f.read(size)
+
+    def readinto(self, buffer):
+        with self._stats.phase(self._name):
+            return self._f.readinto(buffer)
+
+    def seek(self, offset, whence=0):
+        with self._stats.phase(self._name):
+            return self._f.seek(offset, whence)
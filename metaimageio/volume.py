@@ -0,0 +1,85 @@
+import operator
+import pathlib
+
+import numpy as np
+
+from .reader import _check_slices, _clean, _iter_slabs, _read_header, _read_region, _shape
+
+
+def open(filepath):  # noqa: A001
+    return Volume(filepath)
+
+
+class Volume:
+
+    def __init__(self, filepath):
+        self.filepath = pathlib.Path(filepath)
+        self._meta, self._datapaths, self._offset = _read_header(self.filepath)
+        self.shape = _shape(self._meta)
+        self.dtype = np.dtype(self._meta['ElementType'])
+
+    @property
+    def meta(self):
+        return _clean(self._meta)
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    @property
+    def size(self):
+        return int(np.prod(self.shape))
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __array__(self, dtype=None, copy=None):
+        _ = copy
+        image = self[...]
+        return image if dtype is None else image.astype(dtype, copy=False)
+
+    def __iter__(self):
+        for slab in self.slabs():
+            yield slab[0]
+
+    def slabs(self, size=1, slices=None):
+        slices = _check_slices(slices, len(self))
+        yield from _iter_slabs(self._meta, self._datapaths, self._offset, slices, size)
+
+    def __getitem__(self, index):
+        region, squeeze, flip = self._region(index)
+        image = _read_region(self._meta, self._datapaths, self._offset, region)
+        if flip:
+            image = image[tuple(slice(None, None, -1) if i in flip else slice(None) for i in range(self.ndim))]
+        return np.squeeze(image, axis=tuple(squeeze))
+
+    def _region(self, index):
+        # translate basic indexing into ascending ranges along each axis
+        if not isinstance(index, tuple):
+            index = (index,)
+        ellipses = [i for i, x in enumerate(index) if x is Ellipsis]
+        if len(ellipses) > 1:
+            raise IndexError('An index can only have a single ellipsis')
+        if ellipses:
+            index = (*index[:ellipses[0]], *(slice(None),) * (self.ndim - len(index) + 1), *index[ellipses[0] + 1:])
+        if len(index) > self.ndim:
+            raise IndexError(f'Too many indices for volume of dimension {self.ndim}')
+        index = (*index, *(slice(None),) * (self.ndim - len(index)))
+        region, squeeze, flip = [], [], []
+        for i, (x, n) in enumerate(zip(index, self.shape)):
+            if isinstance(x, slice):
+                r = range(*x.indices(n))
+                if r.step < 0:
+                    r = r[::-1]
+                    flip.append(i)
+                region.append(r)
+            else:
+                try:
+                    x = operator.index(x)
+                except TypeError as exception:
+                    raise IndexError('Only integers, slices and ellipsis are valid indices') from exception
+                if not -n <= x < n:
+                    raise IndexError(f'Index {x} is out of bounds for axis {i} with size {n}')
+                region.append(range(x % n, x % n + 1))
+                squeeze.append(i)
+        return tuple(region), squeeze, flip
@@ -1,63 +1,186 @@
-import contextlib
+import concurrent.futures
 import pathlib
-import zlib
 
 import numpy as np
 
-# https://itk.org/Wiki/ITK/MetaIO/Documentation#Reference:_Tags_of_MetaImage
-TAGS = (
-    'Comment',                  # MET_STRING
-    'ObjectType',               # MET_STRING (Image)
-    'ObjectSubType',            # MET_STRING
-    'TransformType',            # MET_STRING (Rigid)
-    'NDims',                    # MET_INT
-    'Name',                     # MET_STRING
-    'ID',                       # MET_INT
-    'ParentID',                 # MET_INT
-    'CompressedData',           # MET_STRING (boolean)
-    'CompressedDataSize',       # MET_INT
-    'BinaryData',               # MET_STRING (boolean)
-    'BinaryDataByteOrderMSB',   # MET_STRING (boolean)
-    'ElementByteOrderMSB',      # MET_STRING (boolean)
-    'Color',                    # MET_FLOAT_ARRAY[4]
-    'Position',                 # MET_FLOAT_ARRAY[NDims]
-    'Offset',                   # == Position
-    'Origin',                   # == Position
-    'Orientation',              # MET_FLOAT_MATRIX[NDims][NDims]
-    'Rotation',                 # == Orientation
-    'TransformMatrix',          # == Orientation
-    'CenterOfRotation',         # MET_FLOAT_ARRAY[NDims]
-    'AnatomicalOrientation',    # MET_STRING (RAS)
-    'ElementSpacing',           # MET_FLOAT_ARRAY[NDims]
-    'DimSize',                  # MET_INT_ARRAY[NDims]
-    'HeaderSize',               # MET_INT
-    'HeaderSizePerSlice',       # MET_INT (non-standard tag for handling per slice header)
-    'HeaderSizesPerDataFile',   # MET_INT_ARRAY[NDataFile] (non-standard tag for handling variable per ElementDataFile header)
-    'Modality',                 # MET_STRING (MET_MOD_CT)
-    'SequenceID',               # MET_INT_ARRAY[4]
-    'ElementMin',               # MET_FLOAT
-    'ElementMax',               # MET_FLOAT
-    'ElementNumberOfChannels',  # MET_INT
-    'ElementSize',              # MET_FLOAT_ARRAY[NDims]
-    'ElementType',              # MET_STRING (MET_UINT)
-    'ElementDataFile')          # MET_STRING
-
-TYPES = {
-    'MET_CHAR': np.int8,
-    'MET_UCHAR': np.uint8,
-    'MET_SHORT': np.int16,
-    'MET_USHORT': np.uint16,
-    'MET_INT': np.int32,
-    'MET_UINT': np.uint32,
-    'MET_LONG': np.int64,
-    'MET_ULONG': np.uint64,
-    'MET_FLOAT': np.float32,
-    'MET_DOUBLE': np.float64}
-
-
-def write(filepath, image=None, **kwargs):
+from . import compression, header
+from .header import TAG_NAMES, TAGS, TYPES  # noqa: F401
+from .stats import phase
+
+HEADER_FIELD_WIDTH = 20
+
+
+def write(filepath, image=None, threads=1, compression_level=2, stats=None, **kwargs):
     filepath = pathlib.Path(filepath)
+    if image is not None:
+        image = np.asarray(image)
+    meta = _init_meta(filepath, image, kwargs)
+
+    # prepare image for saving
+    if image is not None:
+        if isinstance(meta['ElementDataFile'], (tuple, list)):
+            datapaths = meta['ElementDataFile']
+            mode = 'wb'
+            if np.ndim(image) < 2 or np.shape(image)[0] != len(datapaths):
+                raise ValueError('Number filenames does not match number of slices')
+        elif meta['ElementDataFile'].upper() == 'LOCAL':
+            datapaths = [str(filepath)]
+            mode = 'ab'
+        else:
+            datapaths = [meta['ElementDataFile']]
+            mode = 'wb'
+        if meta.get('CompressedData') and meta['CompressedBlockSlices'] is not None:
+            if len(datapaths) > 1:
+                raise ValueError('Only single ElementDataFile is supported with CompressedBlockSlices')
+            if meta['CompressedBlockSlices'] < 1:
+                raise ValueError('CompressedBlockSlices must be positive')
+        datas = [image[i] for i in range(len(datapaths))] if len(datapaths) > 1 else [image]
+        if len(datas) > 1 and threads > 1:
+            # encode each ElementDataFile in parallel instead of chunks within each file
+            with concurrent.futures.ThreadPoolExecutor(threads) as executor:
+                datas = list(executor.map(_encode, datas, [meta] * len(datas), [1] * len(datas), [compression_level] * len(datas), [stats] * len(datas)))
+        else:
+            datas = [_encode(x, meta, threads, compression_level, stats) for x in datas]
+        if meta.get('CompressedData'):
+            meta['CompressedDataSize'] = sum(sum(x[1]) for x in datas)
+            if meta['CompressedBlockSlices'] is not None:
+                meta['CompressedBlockSizes'] = np.array(datas[0][1])
+        datas = [x[0] for x in datas]
+
+    # write metadata to file
+    with phase(stats, 'header'), filepath.open('wb') if stats is None else stats.open(filepath, 'wb') as f:
+        f.write(header.serialize(header.format_meta(meta)))
+
+    # write image to file
+    if image is not None:
+        datapaths = [pathlib.Path(x) for x in datapaths]
+        datapaths = [filepath.parent / x if filepath != x and not x.is_absolute() else x for x in datapaths]
+        if len(datapaths) > 1 and threads > 1:
+            with concurrent.futures.ThreadPoolExecutor(threads) as executor:
+                list(executor.map(_write_data, datapaths, [mode] * len(datapaths), datas, [stats] * len(datapaths)))
+        else:
+            for datapath, data in zip(datapaths, datas):
+                _write_data(datapath, mode, data, stats)
+
+    # remove unused metadata
+    return {x: y for x, y in meta.items() if y is not None}
+
+
+class MetaImageWriter:
+
+    def __init__(self, filepath, compression_level=2, stats=None, **kwargs):
+        self.filepath = pathlib.Path(filepath)
+        self.meta = None
+        self._compression_level = compression_level
+        self._stats = stats
+        self._kwargs = kwargs
+        self._f = None
+        self._datapath = None
+        self._compressor = None
+        self._positions = {}
+        self._shape = None
+        self._length = 0
 
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.abort()
+        else:
+            self.close()
+
+    def append(self, slab):
+        slab = np.asarray(slab)
+        if np.ndim(slab) < 1:
+            raise ValueError('Slab must have a leading slice dimension')
+        if self.meta is None:
+            self._open(slab)
+        elif self._f is None:
+            raise ValueError('MetaImageWriter is closed')
+        elif np.shape(slab)[1:] != self._shape:
+            raise ValueError('Shape of slab does not match previously appended slabs')
+        dtype = np.dtype(self.meta['ElementType'])
+        if self.meta.get('BinaryDataByteOrderMSB') or self.meta.get('ElementByteOrderMSB'):
+            dtype = dtype.newbyteorder('>')
+        chunks = _iter_chunks(slab, dtype) if self._stats is None else self._stats.iterate(_iter_chunks(slab, dtype), 'astype')
+        for chunk in chunks:
+            data = chunk
+            if self._compressor is not None:
+                with phase(self._stats, 'compress'):
+                    data = self._compressor.compress(chunk)
+                self.meta['CompressedDataSize'] += len(data)
+            self._f.write(data)
+        self._length += len(slab)
+
+    def close(self):
+        if self.meta is None:
+            self.meta = write(self.filepath, stats=self._stats, **self._kwargs)
+        if self._f is None:
+            return self.meta
+        if self._compressor is not None:
+            with phase(self._stats, 'compress'):
+                data = self._compressor.flush()
+            self.meta['CompressedDataSize'] += len(data)
+            self._f.write(data)
+        self.meta['DimSize'] = np.array([*self.meta['DimSize'][:-1], self._length])
+        # patch sizes into the fixed width fields of the header
+        for key, value in (('DimSize', self._length), ('CompressedDataSize', self.meta['CompressedDataSize'])):
+            if key in self._positions:
+                self._f.seek(self._positions[key])
+                self._f.write(f'{value:0{HEADER_FIELD_WIDTH}d}'.encode())
+        self._f.close()
+        self._f = None
+        if not self._positions:
+            with phase(self._stats, 'header'), self._open_file(self.filepath) as f:
+                f.write(header.serialize(header.format_meta(self.meta)))
+        self.meta = {x: y for x, y in self.meta.items() if y is not None}
+        return self.meta
+
+    def abort(self):
+        # discard the partially written data instead of patching a valid looking header
+        if self._f is None:
+            return
+        self._f.close()
+        self._f = None
+        self._datapath.unlink(missing_ok=True)
+
+    def _open(self, slab):
+        self.meta = _init_meta(self.filepath, np.empty((0, *np.shape(slab)[1:]), dtype=slab.dtype), self._kwargs)
+        if isinstance(self.meta['ElementDataFile'], (tuple, list)):
+            raise ValueError('LIST ElementDataFile is not supported by MetaImageWriter')
+        if self.meta['CompressedBlockSlices'] is not None:
+            raise ValueError('CompressedBlockSlices is not supported by MetaImageWriter')
+        self._shape = np.shape(slab)[1:]
+        if self.meta.get('CompressedData'):
+            self._compressor = compression.compressor(self.meta['CompressedDataCodec'], self._compression_level)
+            self.meta['CompressedDataSize'] = 0
+        if self.meta['ElementDataFile'].upper() != 'LOCAL':
+            datapath = pathlib.Path(self.meta['ElementDataFile'])
+            if not datapath.is_absolute():
+                datapath = self.filepath.parent / datapath
+            self._datapath = datapath
+            self._f = self._open_file(datapath)
+            return
+        # reserve fixed width fields in the header for sizes that are only known on close
+        meta_out = header.format_meta(self.meta)
+        meta_out['DimSize'] = ' '.join([*meta_out['DimSize'].split()[:-1], '0' * HEADER_FIELD_WIDTH])
+        if self._compressor is not None:
+            meta_out['CompressedDataSize'] = '0' * HEADER_FIELD_WIDTH
+        self._datapath = self.filepath
+        self._f = self._open_file(self.filepath)
+        with phase(self._stats, 'header'):
+            for key, value in meta_out.items():
+                line = header.serialize({key: value})
+                if key in ('DimSize', 'CompressedDataSize'):
+                    self._positions[key] = self._f.tell() + len(line) - 1 - HEADER_FIELD_WIDTH
+                self._f.write(line)
+
+    def _open_file(self, path):
+        return path.open('wb') if self._stats is None else self._stats.open(path, 'wb')
+
+
+def _init_meta(filepath, image, kwargs):
     # initialize metadata
     meta = dict.fromkeys(TAGS, None)
     meta['ObjectType'] = 'Image'
@@ -68,7 +191,6 @@ def write(filepath, image=None, **kwargs):
     meta['DimSize'] = np.zeros(3, dtype=int)
     meta['ElementType'] = float
     if image is not None:
-        image = np.asarray(image)
         meta['NDims'] = np.ndim(image)
         meta['ElementSpacing'] = np.ones(np.ndim(image))
         meta['DimSize'] = np.array(np.shape(image)[::-1])
@@ -76,9 +198,7 @@ def write(filepath, image=None, **kwargs):
 
     # input metadata (case incensitive)
     for key, value in kwargs.items():
-        with contextlib.suppress(ValueError):
-            key = TAGS[[x.upper() for x in TAGS].index(key.upper())]
-        meta[key] = value
+        meta[TAG_NAMES.get(key.upper(), key)] = value
 
     # define ElementDataFile
     meta['ElementDataFile'] = meta.pop('ElementDataFile')  # ensure ElementDataFile is the last tag
@@ -95,77 +215,42 @@ def write(filepath, image=None, **kwargs):
         meta['DimSize'] = meta['DimSize'][1:]
         meta['NDims'] -= 1
 
-    # prepare image for saving
-    if image is not None:
-        if meta['ElementDataFile'].upper() == 'LOCAL':
-            datapaths = [str(filepath)]
-            mode = 'ab'
-        elif isinstance(meta['ElementDataFile'], (tuple, list)):
-            datapaths = meta['ElementDataFile']
-            mode = 'wb'
-            if np.ndim(image) != 3 or np.shape(image)[2] != len(datapaths):
-                raise ValueError('Number filenames does not match number of slices')
-        else:
-            datapaths = [meta['ElementDataFile']]
-            mode = 'wb'
-        if meta.get('CompressedData'):
-            meta['CompressedDataSize'] = 0
-        datas = []
-        for i, _ in enumerate(datapaths):
-            data = image[i] if len(datapaths) > 1 else image
-            if meta.get('BinaryDataByteOrderMSB') or meta.get('ElementByteOrderMSB'):
-                data.byteswap(inplace=True)
-            data = data.astype(meta['ElementType']).tobytes()
-            if meta.get('CompressedData'):
-                data = zlib.compress(data, level=2)
-                meta['CompressedDataSize'] += len(data)
-            datas.append(data)
-
-    # typecast metadata to string
-    meta_out = {}
-    for key, value in meta.items():
-        if value is None:
-            continue
-        if key in (
-                'Comment', 'ObjectType', 'ObjectSubType', 'TransformType', 'Name', 'AnatomicalOrientation', 'Modality'):
-            meta_out[key] = value
-        elif key in (
-                'NDims', 'ID', 'ParentID', 'CompressedData', 'CompressedDataSize', 'BinaryData', 'BinaryDataByteOrderMSB', 'ElementByteOrderMSB', 'HeaderSize', 'HeaderSizePerSlice', 'ElementMin',
-                'ElementMax', 'ElementNumberOfChannels'):
-            meta_out[key] = str(value)
-        elif key in (
-                'Color', 'Position', 'Offset', 'Origin', 'CenterOfRotation', 'ElementSpacing', 'DimSize', 'HeaderSizesPerDataFile', 'SequenceID', 'ElementSize'):
-            meta_out[key] = ' '.join(str(x) for x in np.ravel(value))
-        elif key in ('Orientation', 'Rotation', 'TransformMatrix'):
-            meta_out[key] = ' '.join(str(x) for x in np.ravel(np.transpose(value)))
-        elif key == 'ElementType':
-            try:
-                meta_out[key] = [x[0] for x in TYPES.items() if np.issubdtype(value, x[1])][0]
-            except IndexError as exception:
-                raise ValueError(f'ElementType "{value}" is not supported') from exception
-        elif key == 'ElementDataFile':
-            if isinstance(value, (tuple, list)):
-                meta_out[key] = 'LIST'
-                for i in value:
-                    meta_out[key] += f'\n{i}'
-            else:
-                meta_out[key] = value
-        else:
-            meta_out[key] = value
+    return meta
 
-    # write metadata to file
-    with filepath.open('w') as f:
-        for key, value in meta_out.items():
-            f.write(f'{key} = {value}\n')
 
-    # write image to file
-    if image is not None:
-        for i, datapath in enumerate(datapaths):
-            datapath = pathlib.Path(datapath)
-            if filepath != datapath and not datapath.is_absolute():
-                datapath = filepath.parent / datapath
-            with datapath.open(mode) as f:
-                f.write(datas[i])
+def _encode(data, meta, threads, compression_level, stats=None):
+    dtype = np.dtype(meta['ElementType'])
+    if meta.get('BinaryDataByteOrderMSB') or meta.get('ElementByteOrderMSB'):
+        dtype = dtype.newbyteorder('>')
+    chunks = _iter_chunks if stats is None else lambda x, y: stats.iterate(_iter_chunks(x, y), 'astype')
+    if not meta.get('CompressedData'):
+        return chunks(data, dtype), None
+    if meta['CompressedBlockSlices'] is None:
+        with phase(stats, 'compress'):
+            pieces = compression.compress_chunks(chunks(data, dtype), compression_level, threads, meta['CompressedDataCodec'])
+        return pieces, [sum(len(x) for x in pieces)]
+    # compress blocks of slices independently to allow random access
+    pieces, sizes = [], []
+    for j in range(0, len(data), meta['CompressedBlockSlices']):
+        with phase(stats, 'compress'):
+            block = compression.compress_chunks(chunks(data[j:j + meta['CompressedBlockSlices']], dtype), compression_level, threads, meta['CompressedDataCodec'])
+        pieces.extend(block)
+        sizes.append(sum(len(x) for x in block))
+    return pieces, sizes
 
-    # remove unused metadata
-    return {x: y for x, y in meta.items() if y is not None}
+
+def _iter_chunks(data, dtype, chunk_size=compression.COMPRESS_CHUNK_SIZE):
+    # serialize data in bounded chunks, without copying if it is already laid out as dtype
+    if data.dtype == dtype and data.flags.c_contiguous:
+        buffer = memoryview(data.reshape(-1).view(np.uint8))
+        for i in range(0, len(buffer), chunk_size):
+            yield buffer[i:i + chunk_size]
+        return
+    flags = ['buffered', 'external_loop', 'grow_inner', 'zerosize_ok']
+    for chunk in np.nditer(data, flags=flags, op_dtypes=[dtype], casting='unsafe', buffersize=max(1, chunk_size // dtype.itemsize), order='C'):
+        yield chunk.copy().view(np.uint8)
+
+
+def _write_data(datapath, mode, blocks, stats=None):
+    with datapath.open(mode) if stats is None else stats.open(datapath, mode) as f:
+        f.writelines(blocks)
@@ -0,0 +1,123 @@
+import asyncio
+import concurrent.futures
+import threading
+
+import numpy as np
+import pytest
+
+import metaimageio
+from metaimageio import aio, writer
+from metaimageio.volume import Volume
+
+
+def test_aread_awrite(filepath, dtype):
+    rng = np.random.default_rng()
+    a = (100 * rng.random((5, 3, 2))).astype(dtype)
+
+    async def main():
+        with concurrent.futures.ThreadPoolExecutor(2) as executor:
+            semaphore = asyncio.Semaphore(1)
+            await metaimageio.awrite(filepath, a, executor=executor, semaphore=semaphore, chunk_size=1)
+            b, meta = await metaimageio.aread(filepath, executor=executor, semaphore=semaphore, chunk_size=1)
+            c, _ = await metaimageio.aread(filepath, slices=(1, 4))
+            return b, c, meta
+
+    b, c, meta = asyncio.run(main())
+    np.testing.assert_almost_equal(b, a)
+    np.testing.assert_almost_equal(c, a[[1, 4]])
+    np.testing.assert_equal(meta['DimSize'], [2, 3, 5])
+
+
+def test_aiter_slabs(filepath):
+    rng = np.random.default_rng()
+    a = (100 * rng.random((5, 3, 2))).astype(np.float32)
+    metaimageio.write(filepath, a, CompressedData=True)
+
+    async def main():
+        return [x async for x in aio.aiter_slabs(filepath, size=2)]
+
+    np.testing.assert_almost_equal(np.concatenate(asyncio.run(main())), a)
+
+
+def test_aiter_slabs_close(filepath):
+    a = np.arange(30, dtype=np.float32).reshape(5, 3, 2)
+    metaimageio.write(filepath, a)
+
+    async def main():
+        executor = concurrent.futures.ThreadPoolExecutor(1)
+        slabs = aio.aiter_slabs(filepath, executor=executor)
+        slab = await slabs.__anext__()
+        executor.shutdown()
+        await slabs.aclose()
+        return slab
+
+    np.testing.assert_equal(asyncio.run(main()), a[:1])
+
+
+def test_aiter_slabs_cancel(filepath, monkeypatch):
+    a = np.arange(30, dtype=np.float32).reshape(5, 3, 2)
+    metaimageio.write(filepath, a)
+    started, release, finished = threading.Event(), threading.Event(), threading.Event()
+
+    def slow(*_):
+        # block while reading the second slab
+        yield a[:1]
+        started.set()
+        release.wait(10)
+        finished.set()
+        yield a[1:2]
+
+    async def main():
+        slabs = aio.aiter_slabs(filepath)
+        await slabs.__anext__()
+        task = asyncio.create_task(slabs.__anext__())
+        await asyncio.get_running_loop().run_in_executor(None, started.wait)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        # cancelling does not wait for the running slab
+        np.testing.assert_equal(finished.is_set(), False)
+        release.set()
+
+    monkeypatch.setattr(Volume, 'slabs', slow)
+    asyncio.run(main())
+
+
+def test_awrite_cancel(tmp_path, suffix, monkeypatch):
+    a = np.zeros((5, 3, 2), dtype=np.float32)
+    filepath = tmp_path / f'image{suffix}'
+    append = writer.MetaImageWriter.append
+    started, release, finished = threading.Event(), threading.Event(), threading.Event()
+
+    def slow(self, slab):
+        # block while writing the first slab
+        append(self, slab)
+        started.set()
+        release.wait(10)
+        finished.set()
+
+    async def main():
+        task = asyncio.create_task(metaimageio.awrite(filepath, a, chunk_size=1))
+        await asyncio.get_running_loop().run_in_executor(None, started.wait)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        # cancelling does not wait for the running slab
+        np.testing.assert_equal(finished.is_set(), False)
+        release.set()
+
+    monkeypatch.setattr(writer.MetaImageWriter, 'append', slow)
+    asyncio.run(main())
+    np.testing.assert_equal(list(tmp_path.iterdir()), [])
+
+
+def test_awrite_stats(filepath):
+    a = (100 * np.random.default_rng().random((5, 3, 2))).astype(np.int16)
+    stats = metaimageio.Stats()
+    asyncio.run(metaimageio.awrite(filepath, a, chunk_size=1, CompressedData=True, stats=stats))
+    np.testing.assert_equal(b'stats' in filepath.read_bytes(), False)
+    np.testing.assert_equal(set(stats.times), {'header', 'io', 'astype', 'compress'})
+    # sizes are patched into the header of local data
+    size = filepath.stat().st_size + 2 * writer.HEADER_FIELD_WIDTH if filepath.suffix == '.mha' else filepath.stat().st_size + filepath.with_suffix('.zraw').stat().st_size
+    np.testing.assert_equal(stats.bytes_written, size)
+    np.testing.assert_almost_equal(metaimageio.read(filepath)[0], a)
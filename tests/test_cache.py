@@ -0,0 +1,85 @@
+import os
+
+import numpy as np
+import pytest
+
+import metaimageio
+
+
+def test_array_cache(tmp_path):
+    rng = np.random.default_rng()
+    a = (100 * rng.random((4, 8, 8))).astype(np.float32)
+    filepaths = [tmp_path / f'image{i}.mha' for i in range(3)]
+    for filepath in filepaths:
+        metaimageio.write(filepath, a)
+    cache = metaimageio.ArrayCache(max_bytes=2 * a.nbytes)
+    b, meta = cache.read(filepaths[0])
+    np.testing.assert_almost_equal(b, a)
+    with pytest.raises(ValueError, match='read-only'):
+        b[0] = 0
+    meta['DimSize'][0] = 0
+    c, meta = cache.read(filepaths[0])
+    np.testing.assert_equal(c is b, True)
+    np.testing.assert_equal(meta['DimSize'], [8, 8, 4])
+    c, _ = cache.read(filepaths[0], slices=(1, 2))
+    np.testing.assert_almost_equal(c, a[1:3])
+    np.testing.assert_equal((cache.hits, cache.misses, cache.evictions, len(cache)), (1, 2, 0, 2))
+    cache.read(filepaths[1])
+    cache.read(filepaths[2])
+    np.testing.assert_equal((cache.evictions, cache.nbytes <= cache.max_bytes), (2, True))
+    # a modified file is read again
+    metaimageio.write(filepaths[2], a[:2])
+    c, _ = cache.read(filepaths[2])
+    np.testing.assert_almost_equal(c, a[:2])
+    np.testing.assert_equal(cache.misses, 5)
+    # a replaced data file is read again, even if its header is unchanged
+    filepath = tmp_path / 'image.mhd'
+    metaimageio.write(filepath, a)
+    cache.read(filepath)
+    (2 * a).tofile(tmp_path / 'replaced.raw')
+    (tmp_path / 'replaced.raw').replace(tmp_path / 'image.raw')
+    c, _ = cache.read(filepath)
+    np.testing.assert_almost_equal(c, 2 * a)
+    cache.clear()
+    np.testing.assert_equal((len(cache), cache.nbytes), (0, 0))
+
+
+def test_disk_cache(tmp_path, monkeypatch):
+    rng = np.random.default_rng()
+    a = (100 * rng.random((6, 8, 8))).astype(np.int16)
+    filepaths = [tmp_path / f'image{i}.mhd' for i in range(3)]
+    for filepath in filepaths:
+        metaimageio.write(filepath, a, CompressedData=True, ElementByteOrderMSB=True)
+    with pytest.raises(ValueError, match='DiskCache'):
+        metaimageio.read(filepaths[0], memmap=True)
+    cache = metaimageio.DiskCache(tmp_path / 'cache', max_bytes=2 * a.nbytes + 256)
+    with pytest.raises(ValueError, match='memmap'):
+        metaimageio.read(filepaths[0], cache=cache)
+    with pytest.raises(ValueError, match='DiskCache'):
+        metaimageio.read(filepaths[0], memmap=True, cache=metaimageio.ArrayCache())
+    b, meta = metaimageio.read(filepaths[0], memmap=True, cache=cache)
+    np.testing.assert_equal(isinstance(b, np.memmap), True)
+    np.testing.assert_equal(b, a)
+    np.testing.assert_equal(meta['CompressedData'], True)
+    b, _ = metaimageio.read(filepaths[0], memmap=True, cache=cache, slices=(1, 3, 5))
+    np.testing.assert_equal(b, a[1::2])
+    b, _ = metaimageio.read(filepaths[0], memmap=True, cache=cache, roi=((1, 2), (2, 4)))
+    np.testing.assert_equal(b, a[1:2, 2:4])
+    np.testing.assert_equal(len(list(cache.directory.glob('*.npy'))), 1)
+    for filepath in filepaths[1:]:
+        cache.read(filepath)
+    np.testing.assert_equal(len(list(cache.directory.glob('*.npy'))), 2)
+    # a modified file is decompressed again
+    metaimageio.write(filepaths[2], a[:3], CompressedData=True)
+    b, _ = cache.read(filepaths[2])
+    np.testing.assert_equal(b, a[:3])
+    # writes to the mapped copy do not reach the cached file
+    b[...] = 0
+    np.testing.assert_equal(cache.read(filepaths[2])[0], a[:3])
+    # an entry evicted by another process after it was touched is written again
+    monkeypatch.setattr(os, 'utime', lambda *_: None)
+    cache.clear()
+    b, _ = cache.read(filepaths[2])
+    np.testing.assert_equal(b, a[:3])
+    cache.clear()
+    np.testing.assert_equal(list(cache.directory.iterdir()), [])
@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+import metaimageio
+
+
+def test_catalog(tmp_path):
+    (tmp_path / 'a').mkdir()
+    metaimageio.write(tmp_path / 'a' / 'ct.mha', np.zeros((4, 5, 6), dtype=np.int16), Modality='MET_MOD_CT', ElementSpacing=(0.5, 0.5, 2))
+    metaimageio.write(tmp_path / 'mr.mhd', np.zeros((5, 6), dtype=np.float32), Modality='MET_MOD_MR', CompressedData=True)
+    (tmp_path / 'broken.mha').write_bytes(b'ElementType = MET_UNKNOWN\nElementDataFile = LOCAL\n')
+    # a catalog without index is empty until refreshed
+    catalog = metaimageio.Catalog(tmp_path)
+    np.testing.assert_equal(len(catalog), 0)
+    np.testing.assert_equal(catalog.query(Modality='MET_MOD_CT', DimSize=(6, 5))['path'], [])
+    catalog.refresh()
+    np.testing.assert_equal(len(catalog), 2)
+    np.testing.assert_equal(list(catalog.errors), ['broken.mha'])
+    result = catalog.query(Modality='MET_MOD_CT')
+    np.testing.assert_equal(result['path'], [str(tmp_path / 'a' / 'ct.mha')])
+    np.testing.assert_equal(result['DimSize'], [[6, 5, 4]])
+    np.testing.assert_equal(result['ElementSpacing'], [[0.5, 0.5, 2]])
+    np.testing.assert_equal(catalog.query(DimSize=(6, 5))['path'], [str(tmp_path / 'mr.mhd')])
+    np.testing.assert_equal(catalog.query(DimSize=(6, 5, 4, 3, 2, 1, 1, 1, 1, 1))['path'], [])
+    np.testing.assert_equal(catalog.query(ElementType='MET_FLOAT', CompressedData=True)['path'], [str(tmp_path / 'mr.mhd')])
+    np.testing.assert_equal(len(catalog.query(DimSize=lambda x: x[:, 0] > 5)['path']), 2)
+    with pytest.raises(ValueError, match='Column'):
+        catalog.query(Unknown=1)
+    # refresh incrementally from the saved index
+    (tmp_path / 'broken.mha').unlink()
+    metaimageio.write(tmp_path / 'mr.mhd', np.zeros((5, 6, 7), dtype=np.uint8))
+    catalog = metaimageio.Catalog(tmp_path)
+    np.testing.assert_equal(len(catalog), 2)
+    catalog.refresh()
+    np.testing.assert_equal(catalog.query(Modality='MET_MOD_MR')['path'], [])
+    np.testing.assert_equal(catalog.query(ElementType='MET_UCHAR')['DimSize'], [[7, 6, 5]])
+    np.testing.assert_equal(catalog.query(Modality='MET_MOD_CT')['DimSize'], [[6, 5, 4]])
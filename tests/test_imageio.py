@@ -31,3 +31,50 @@ def test_imageio_v3(filepath):
     np.testing.assert_almost_equal(b, a)
     meta = iio.immeta(filepath, plugin=MetaImageIOPlugin)
     np.testing.assert_almost_equal(meta['DimSize'], [2, 3, 4])
+
+
+def test_imageio_v3_frames(filepath):
+    try:
+        import imageio.v3 as iio
+    except ModuleNotFoundError:
+        pytest.skip()
+    from metaimageio.imageio import MetaImageIOPlugin
+    rng = np.random.default_rng()
+    a = (100 * rng.random((5, 4, 3, 2))).astype(np.float32)
+    iio.imwrite(filepath, a, plugin=MetaImageIOPlugin, ElementSpacing=(1, 2, 3, 4))
+    b = list(iio.imiter(filepath, plugin=MetaImageIOPlugin))
+    np.testing.assert_equal(len(b), 5)
+    np.testing.assert_almost_equal(b, a)
+    np.testing.assert_almost_equal(iio.imread(filepath, index=2, plugin=MetaImageIOPlugin), a[2])
+    with iio.imopen(filepath, 'r', plugin=MetaImageIOPlugin) as f:
+        b = f.read(index=-1, memmap=True)
+        np.testing.assert_equal(isinstance(b, np.memmap), True)
+        np.testing.assert_almost_equal(b, a[-1])
+    np.testing.assert_equal(iio.imread(filepath, index=1, plugin=MetaImageIOPlugin, dtype=np.int16), a[1].astype(np.int16))
+    with pytest.raises(ValueError, match='index'):
+        iio.imread(filepath, index=1, plugin=MetaImageIOPlugin, slices=(0,))
+    np.testing.assert_almost_equal(iio.imread(filepath, index=..., plugin=MetaImageIOPlugin), a)
+    properties = iio.improps(filepath, index=..., plugin=MetaImageIOPlugin)
+    np.testing.assert_equal((properties.shape, properties.n_images, properties.is_batch, properties.spacing), ((5, 4, 3, 2), 5, True, (4, 3, 2, 1)))
+    properties = iio.improps(filepath, index=0, plugin=MetaImageIOPlugin)
+    np.testing.assert_equal((properties.shape, properties.n_images, properties.is_batch, properties.spacing), ((4, 3, 2), None, False, (3, 2, 1)))
+
+
+def test_imageio_v2_frames(filepath):
+    try:
+        import imageio.v2 as iio
+    except ModuleNotFoundError:
+        pytest.skip()
+    from metaimageio.imageio import add_format
+    add_format()
+    rng = np.random.default_rng()
+    a = (100 * rng.random((5, 4, 3))).astype(np.float32)
+    iio.imwrite(filepath, a, format='MetaImageIO')
+    with iio.get_reader(filepath, format='MetaImageIO', mode='I') as r:
+        np.testing.assert_equal(r.get_length(), 5)
+        np.testing.assert_almost_equal(list(r), a)
+        np.testing.assert_almost_equal(r.get_data(3), a[3])
+        np.testing.assert_almost_equal(r.get_data(1), a[1])
+        np.testing.assert_almost_equal(r.get_data(2), a[2])
+    np.testing.assert_almost_equal(iio.mimread(filepath, format='MetaImageIO'), a)
+    np.testing.assert_almost_equal(iio.volread(filepath, format='MetaImageIO'), a)
@@ -1,6 +1,13 @@
+import io
+import threading
+import zlib
+
 import numpy as np
+import pytest
 
 import metaimageio
+from metaimageio import compression, header, reader
+from metaimageio.reader import _read_header
 
 
 def test_channels(filepath_mha, dimension):
@@ -34,3 +41,288 @@ def test_memmap(filepath_mha, dtype):
     b, _ = metaimageio.read(filepath_mha, memmap=True)
     np.testing.assert_almost_equal(b, a)
     del b
+
+
+def test_byteorder(filepath, dtype):
+    rng = np.random.default_rng()
+    a = (100 * rng.random((4, 3, 2))).astype(dtype)
+    c = a.copy()
+    metaimageio.write(filepath, a, ElementByteOrderMSB=True)
+    np.testing.assert_equal(a, c)
+    b, _ = metaimageio.read(filepath)
+    np.testing.assert_almost_equal(b, a)
+
+
+def test_header_size_per_slice(filepath_mha):
+    rng = np.random.default_rng()
+    a = (100 * rng.random((4, 3, 2))).astype(np.uint8)
+    metaimageio.write(filepath_mha, DimSize=a.shape[::-1], ElementType=a.dtype, HeaderSizePerSlice=5)
+    with filepath_mha.open('ab') as f:
+        for x in a:
+            f.write(bytes(5) + x.tobytes())
+    b, _ = metaimageio.read(filepath_mha)
+    np.testing.assert_almost_equal(b, a)
+    b, _ = metaimageio.read(filepath_mha, slices=(1, 3))
+    np.testing.assert_almost_equal(b, a[[1, 3]])
+
+
+def test_slices(filepath, dtype):
+    rng = np.random.default_rng()
+    a = (100 * rng.random((4, 3, 2))).astype(dtype)
+    metaimageio.write(filepath, a)
+    b, _ = metaimageio.read(filepath, slices=(0, 2, 3))
+    np.testing.assert_almost_equal(b, a[[0, 2, 3]])
+    b, meta = metaimageio.read(filepath, slices=())
+    np.testing.assert_equal(b, None)
+    np.testing.assert_almost_equal(meta['DimSize'], [2, 3, 4])
+
+
+def test_compression_slices(filepath):
+    rng = np.random.default_rng()
+    a = (100 * rng.random((16, 64, 64))).astype(np.float32)
+    metaimageio.write(filepath, a, CompressedData=True)
+    b, _ = metaimageio.read(filepath, slices=(1, 2, 7, 15))
+    np.testing.assert_almost_equal(b, a[[1, 2, 7, 15]])
+
+
+def test_decompress_reader():
+    rng = np.random.default_rng()
+    a = rng.integers(0, 4, 100000, dtype=np.uint8).tobytes()
+    f = compression.DecompressReader(io.BytesIO(zlib.compress(a)), chunk_size=100)
+    np.testing.assert_equal(f.read(10), a[:10])
+    f.seek(5000, 1)
+    np.testing.assert_equal(f.read(), a[5010:])
+
+
+def test_compression_blocks(filepath):
+    rng = np.random.default_rng()
+    a = (100 * rng.random((16, 64, 64))).astype(np.float32)
+    metaimageio.write(filepath, a, CompressedData=True, CompressedBlockSlices=3)
+    b, meta = metaimageio.read(filepath)
+    np.testing.assert_almost_equal(b, a)
+    np.testing.assert_equal(len(meta['CompressedBlockSizes']), 6)
+    b, _ = metaimageio.read(filepath, slices=(1, 2, 7, 15))
+    np.testing.assert_almost_equal(b, a[[1, 2, 7, 15]])
+
+
+def test_compression_threads(filepath):
+    rng = np.random.default_rng()
+    a = (100 * rng.random((16, 64, 64))).astype(np.float32)
+    metaimageio.write(filepath, a, CompressedData=True, threads=4, compression_level=6)
+    b, _ = metaimageio.read(filepath)
+    np.testing.assert_almost_equal(b, a)
+
+
+def test_compress():
+    rng = np.random.default_rng()
+    a = rng.integers(0, 4, 100000, dtype=np.uint8).tobytes()
+    for threads in (1, 4):
+        np.testing.assert_equal(zlib.decompress(compression.compress(a, threads=threads, chunk_size=999)), a)
+
+
+@pytest.mark.parametrize('codec', ['zlib', 'lzma', 'bz2'])
+def test_compression_codecs(filepath, codec):
+    rng = np.random.default_rng()
+    a = (100 * rng.random((16, 64, 64))).astype(np.float32)
+    metaimageio.write(filepath, a, CompressedData=True, CompressedDataCodec=codec, compression_level=6, threads=2)
+    b, meta = metaimageio.read(filepath)
+    np.testing.assert_almost_equal(b, a)
+    np.testing.assert_equal(meta['CompressedDataCodec'], codec)
+    b, _ = metaimageio.read(filepath, slices=(1, 2, 7, 15))
+    np.testing.assert_almost_equal(b, a[[1, 2, 7, 15]])
+    metaimageio.write(filepath, a, CompressedData=True, CompressedDataCodec=codec, CompressedBlockSlices=5)
+    b, _ = metaimageio.read(filepath, slices=(1, 7, 15))
+    np.testing.assert_almost_equal(b, a[[1, 7, 15]])
+    f = compression.DecompressReader(io.BytesIO(compression.compress(a, codec=codec)), chunk_size=100, codec=codec)
+    np.testing.assert_equal(f.read(10), a.tobytes()[:10])
+    f.seek(5000, 1)
+    np.testing.assert_equal(f.read(), a.tobytes()[5010:])
+
+
+def test_compression_codec_unknown(filepath):
+    with pytest.raises(ValueError, match='not supported'):
+        metaimageio.write(filepath, np.zeros((2, 3, 4)), CompressedData=True, CompressedDataCodec='unknown')
+
+
+def test_list(tmp_path, dtype):
+    rng = np.random.default_rng()
+    a = (100 * rng.random((4, 3, 2))).astype(dtype)
+    metaimageio.write(tmp_path / 'image.mhd', a, ElementDataFile=[f'image{i}.raw' for i in range(4)], threads=2)
+    b, _ = metaimageio.read(tmp_path / 'image.mhd', workers=2)
+    np.testing.assert_almost_equal(b, a)
+    b, _ = metaimageio.read(tmp_path / 'image.mhd', slices=(1, 3), workers=2)
+    np.testing.assert_almost_equal(b, a[[1, 3]])
+
+
+def test_memmap_layout(tmp_path):
+    rng = np.random.default_rng()
+    a = (100 * rng.random((4, 3, 2))).astype(np.float32)
+    metaimageio.write(tmp_path / 'msb.mha', a.copy(), ElementByteOrderMSB=True)
+    b, _ = metaimageio.read(tmp_path / 'msb.mha', memmap=True)
+    np.testing.assert_almost_equal(b, a)
+    b, _ = metaimageio.read(tmp_path / 'msb.mha', memmap=True, slices=(0, 2))
+    np.testing.assert_almost_equal(b, a[[0, 2]])
+    b, _ = metaimageio.read(tmp_path / 'msb.mha', memmap=True, slices=(0, 1, 3))
+    np.testing.assert_almost_equal(b[1:, ..., 1], a[[1, 3], ..., 1])
+    metaimageio.write(tmp_path / 'list.mhd', a, ElementDataFile=[f'list{i}.raw' for i in range(4)])
+    b, _ = metaimageio.read(tmp_path / 'list.mhd', memmap=True)
+    np.testing.assert_almost_equal(b[1:3, 1], a[1:3, 1])
+    np.testing.assert_almost_equal(b, a)
+    metaimageio.write(tmp_path / 'header.mha', DimSize=a.shape[::-1], ElementType=a.dtype, HeaderSizePerSlice=5)
+    with (tmp_path / 'header.mha').open('ab') as f:
+        for x in a:
+            f.write(bytes(5) + x.tobytes())
+    b, _ = metaimageio.read(tmp_path / 'header.mha', memmap=True)
+    np.testing.assert_almost_equal(b, a)
+    del b
+
+
+def test_read_header(filepath):
+    rng = np.random.default_rng()
+    a = (100 * rng.random((4, 3, 2))).astype(np.uint8)
+    metaimageio.write(filepath, a)
+    meta = metaimageio.read_header(filepath)
+    np.testing.assert_equal(meta['DimSize'], [2, 3, 4])
+    meta['DimSize'][0] = 0
+    np.testing.assert_equal(metaimageio.read_header(filepath)['DimSize'], [2, 3, 4])
+    metaimageio.write(filepath, a[:2])
+    np.testing.assert_equal(metaimageio.read_header(filepath)['DimSize'], [2, 3, 2])
+
+
+def test_writer(filepath, dtype):
+    rng = np.random.default_rng()
+    a = (100 * rng.random((5, 3, 2))).astype(dtype)
+    for kwargs in ({}, {'CompressedData': True}, {'ElementByteOrderMSB': True}):
+        with metaimageio.MetaImageWriter(filepath, **kwargs) as writer:
+            writer.append(a[:2])
+            writer.append(a[2:])
+        b, meta = metaimageio.read(filepath)
+        np.testing.assert_almost_equal(b, a)
+        np.testing.assert_equal(meta['DimSize'], [2, 3, 5])
+    # an error while writing leaves no truncated image behind
+    filepath.unlink()
+    with pytest.raises(RuntimeError), metaimageio.MetaImageWriter(filepath) as writer:
+        writer.append(a[:2])
+        raise RuntimeError
+    np.testing.assert_equal(filepath.with_suffix('.raw').exists() or filepath.exists(), False)
+
+
+def test_noncontiguous(filepath, dtype):
+    rng = np.random.default_rng()
+    a = (100 * rng.random((2, 3, 4))).astype(dtype).transpose()
+    for kwargs in ({}, {'CompressedData': True}, {'ElementType': np.float64, 'ElementByteOrderMSB': True}):
+        metaimageio.write(filepath, a, **kwargs)
+        b, _ = metaimageio.read(filepath)
+        np.testing.assert_almost_equal(b, a)
+
+
+def test_read_many(tmp_path, monkeypatch):
+    rng = np.random.default_rng()
+    images = [(100 * rng.random((4, 3, i + 1))).astype(np.int16) for i in range(10)]
+    filepaths = [tmp_path / f'image{i}.mha' for i in range(len(images))]
+    for filepath, a in zip(filepaths, images):
+        metaimageio.write(filepath, a)
+    results = list(metaimageio.read_many(filepaths, workers=3, max_bytes=100))
+    np.testing.assert_equal([x[0] for x in results], filepaths)
+    for (_, b, _), a in zip(results, images):
+        np.testing.assert_almost_equal(b, a)
+    results = list(metaimageio.read_many(filepaths, slices=(1, 2), ordered=False))
+    np.testing.assert_equal(sorted(x[0] for x in results), sorted(filepaths))
+    for filepath, b, _ in results:
+        np.testing.assert_almost_equal(b, images[filepaths.index(filepath)][1:3])
+    # headers are parsed in the pool
+    threads = set()
+    monkeypatch.setattr(reader, '_read_header', lambda *args: threads.add(threading.get_ident()) or _read_header(*args))
+    list(metaimageio.read_many(filepaths, workers=3))
+    np.testing.assert_equal(threading.get_ident() in threads, False)
+
+
+def test_stats(filepath):
+    rng = np.random.default_rng()
+    a = (100 * rng.random((10, 20, 30))).astype(np.int16)
+    stats = metaimageio.Stats()
+    metaimageio.write(filepath, a, CompressedData=True, ElementByteOrderMSB=True, stats=stats)
+    np.testing.assert_equal(stats.files_opened, 2)
+    np.testing.assert_equal(set(stats.times), {'header', 'io', 'astype', 'compress'})
+    size = filepath.stat().st_size if filepath.suffix == '.mha' else filepath.stat().st_size + filepath.with_suffix('.zraw').stat().st_size
+    np.testing.assert_equal(stats.bytes_written, size)
+    stats = metaimageio.Stats()
+    b, _ = metaimageio.read(filepath, stats=stats)
+    np.testing.assert_almost_equal(b, a)
+    np.testing.assert_equal(stats.files_opened, 2)
+    np.testing.assert_equal(set(stats.times), {'header', 'io', 'decompress', 'byteswap'})
+    np.testing.assert_equal(stats.as_dict()['reads'] > 0, True)
+    np.testing.assert_equal(stats.seeks, 1)
+    # the header of local data is read in blocks overlapping the data
+    np.testing.assert_equal(stats.bytes_read == size if filepath.suffix == '.mhd' else stats.bytes_read > size, True)
+    # a cached header is not read again
+    stats = metaimageio.Stats()
+    metaimageio.read(filepath, stats=stats)
+    np.testing.assert_equal(stats.files_opened, 1)
+
+
+def test_roi(tmp_path, dtype):
+    rng = np.random.default_rng()
+    a = (100 * rng.random((12, 20, 30))).astype(dtype)
+    roi = ((2, 9), (3, 4), (5, 25))
+    for filepath, kwargs in (
+            (tmp_path / 'image.mha', {}),
+            (tmp_path / 'image.mhd', {'ElementByteOrderMSB': True}),
+            (tmp_path / 'image.mhd', {'CompressedData': True}),
+            (tmp_path / 'list.mhd', {'ElementDataFile': [f'image{i}.raw' for i in range(12)]})):
+        metaimageio.write(filepath, a, **kwargs)
+        b, _ = metaimageio.read(filepath, roi=roi)
+        np.testing.assert_almost_equal(b, a[2:9, 3:4, 5:25])
+        b, _ = metaimageio.read(filepath, roi=(None, (0, 0)))
+        np.testing.assert_equal(b.shape, (12, 0, 30))
+        if not kwargs.get('CompressedData'):
+            b, _ = metaimageio.read(filepath, roi=roi, memmap=True)
+            np.testing.assert_almost_equal(np.asarray(b), a[2:9, 3:4, 5:25])
+    with pytest.raises(ValueError, match='bounded'):
+        metaimageio.read(filepath, roi=((0, 13),))
+    with pytest.raises(ValueError, match='together'):
+        metaimageio.read(filepath, roi=((0, 1),), slices=(0,))
+
+
+def test_header(tmp_path):
+    rng = np.random.default_rng()
+    a = (100 * rng.random((3, 4, 5))).astype(np.uint8)
+    filepath = tmp_path / 'list.mhd'
+    metaimageio.write(filepath, a, ElementDataFile=[f'image{i}.raw' for i in range(3)])
+    meta = metaimageio.read_header(filepath)
+    np.testing.assert_equal(sorted(meta), ['BinaryData', 'BinaryDataByteOrderMSB', 'DimSize', 'ElementSpacing', 'ElementType', 'NDims', 'ObjectType'])
+    # case variations, windows line endings and a header spanning multiple blocks
+    filepath = tmp_path / 'image.mha'
+    comment = 'x' * 2 * header.BLOCK_SIZE
+    filepath.write_bytes(f'objecttype = Image\r\nComment = {comment}\r\nNDIMS = 3\r\ndimsize = 5 4 3\r\nElementType = MET_UCHAR\r\nelementdatafile = LOCAL\r\n'.encode() + a.tobytes())
+    b, meta = metaimageio.read(filepath)
+    np.testing.assert_equal(b, a)
+    np.testing.assert_equal(meta['Comment'], comment)
+    np.testing.assert_equal(meta['NDims'], 3)
+
+
+def test_dtype(tmp_path, monkeypatch):
+    # stream conversions in chunks of a few slices
+    monkeypatch.setattr(reader, 'CHUNK_SIZE', 7 * 8 * 2 * 2)
+    rng = np.random.default_rng()
+    a = (1000 * rng.random((6, 7, 8))).astype(np.int16)
+    for filepath, kwargs in (
+            (tmp_path / 'image.mha', {}),
+            (tmp_path / 'image.mhd', {'ElementByteOrderMSB': True}),
+            (tmp_path / 'image.mhd', {'CompressedData': True, 'ElementByteOrderMSB': True}),
+            (tmp_path / 'list.mhd', {'ElementDataFile': [f'image{i}.raw' for i in range(6)], 'ElementByteOrderMSB': True})):
+        metaimageio.write(filepath, a, **kwargs)
+        b, _ = metaimageio.read(filepath, dtype=np.float32)
+        np.testing.assert_equal(b.dtype, np.float32)
+        np.testing.assert_equal(b, a)
+        b, _ = metaimageio.read(filepath, slices=(1, 4), scale=0.5, offset=-1)
+        np.testing.assert_equal(b.dtype, np.float64)
+        np.testing.assert_almost_equal(b, a[[1, 4]] * 0.5 - 1)
+        b, _ = metaimageio.read(filepath, roi=((2, 3),), dtype=np.float32, scale=2, out=np.empty((1, 7, 8), dtype=np.float32))
+        np.testing.assert_almost_equal(b, a[2:3] * 2)
+        b, _ = metaimageio.read(filepath, dtype=np.int32, scale=0.5, offset=0.5, workers=2)
+        np.testing.assert_equal(b, (a * 0.5 + 0.5).astype(np.int32))
+        b, _ = metaimageio.read(filepath, roi=((1, 5), (2, 6), (0, 3)), dtype=np.int32, scale=0.5, offset=0.5)
+        np.testing.assert_equal(b, (a[1:5, 2:6, 0:3] * 0.5 + 0.5).astype(np.int32))
+    with pytest.raises(ValueError, match='memmap'):
+        metaimageio.read(filepath, memmap=True, dtype=np.float32)
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+import metaimageio
+from metaimageio import pyramid
+from metaimageio.pyramid import _downsample
+
+
+def test_pyramid(tmp_path):
+    rng = np.random.default_rng()
+    a = (100 * rng.random((9, 20, 33))).astype(np.int16)
+    filepath = tmp_path / 'image.mha'
+    metaimageio.write(filepath, a, ElementSpacing=(0.5, 1, 2), Position=(1, 2, 3))
+    metas = metaimageio.write_pyramid(filepath, levels=2)
+    np.testing.assert_equal(len(metas), 2)
+    b, meta = metaimageio.read(filepath, level=1)
+    np.testing.assert_equal(b.shape, (5, 10, 17))
+    np.testing.assert_equal(b[0, 0, 0], np.rint(a[:2, :2, :2].mean()))
+    np.testing.assert_almost_equal(meta['ElementSpacing'], (1, 2, 4))
+    np.testing.assert_almost_equal(meta['Position'], (1.25, 2.5, 4))
+    b, meta = metaimageio.read(filepath, level=2, roi=((0, 1),))
+    np.testing.assert_equal(b.shape, (1, 5, 9))
+    np.testing.assert_almost_equal(meta['ElementSpacing'], (2, 4, 8))
+    np.testing.assert_equal(metaimageio.level_for(filepath, (5, 9)), 2)
+    np.testing.assert_equal(metaimageio.level_for(filepath, (10, 10)), 1)
+    np.testing.assert_equal(metaimageio.level_for(filepath, (20, 20)), 0)
+    with pytest.raises(ValueError, match='Level'):
+        metaimageio.read(filepath, level=3)
+    # a modified image invalidates its pyramid
+    metaimageio.write(filepath, a[:-1])
+    np.testing.assert_equal(metaimageio.level_for(filepath, (5, 9)), 0)
+    with pytest.raises(ValueError, match='pyramid'):
+        metaimageio.read(filepath, level=1)
+
+
+def test_pyramid_channels(tmp_path):
+    rng = np.random.default_rng()
+    a = (100 * rng.random((4, 6, 8, 3))).astype(np.float32)
+    filepath = tmp_path / 'image.mhd'
+    metaimageio.write(filepath, a, ElementNumberOfChannels=3)
+    metaimageio.write_pyramid(filepath, levels=1)
+    b, _ = metaimageio.read(filepath, level=1)
+    np.testing.assert_equal(b.shape, (2, 3, 4, 3))
+    np.testing.assert_almost_equal(b[1, 2, 3], a[2:, 4:, 6:].mean(axis=(0, 1, 2)), decimal=5)
+
+
+def test_pyramid_error(tmp_path, monkeypatch):
+    filepath = tmp_path / 'image.mha'
+    metaimageio.write(filepath, np.zeros((8, 8, 8), dtype=np.uint8))
+    calls = []
+
+    def fail(*args):
+        # fail after the first slab was written to every level
+        calls.append(None)
+        if len(calls) > 2:
+            raise RuntimeError
+        return _downsample(*args)
+
+    monkeypatch.setattr(pyramid, '_downsample', fail)
+    with pytest.raises(RuntimeError):
+        metaimageio.write_pyramid(filepath, levels=2)
+    np.testing.assert_equal(sorted(x.name for x in tmp_path.iterdir()), ['image.mha'])
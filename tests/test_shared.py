@@ -0,0 +1,37 @@
+import concurrent.futures
+import multiprocessing
+
+import numpy as np
+import pytest
+
+import metaimageio
+from metaimageio import shared
+
+
+def test_out(filepath):
+    rng = np.random.default_rng()
+    a = (100 * rng.random((4, 5, 6))).astype(np.float32)
+    metaimageio.write(filepath, a, CompressedData=filepath.suffix == '.mhd')
+    out = np.zeros_like(a)
+    b, _ = metaimageio.read(filepath, out=out)
+    np.testing.assert_equal(b is out, True)
+    np.testing.assert_almost_equal(out, a)
+    b, _ = metaimageio.read(filepath, out=lambda shape, dtype: np.full(shape, -1, dtype=dtype), roi=((1, 3), (2, 3)))
+    np.testing.assert_almost_equal(b, a[1:3, 2:3])
+    with pytest.raises(ValueError, match='shape'):
+        metaimageio.read(filepath, out=np.zeros((4, 5, 6)))
+    with pytest.raises(ValueError, match='function'):
+        list(metaimageio.read_many([filepath], out=out))
+
+
+def test_shared(filepath):
+    rng = np.random.default_rng()
+    a = (100 * rng.random((4, 5, 6))).astype(np.int16)
+    metaimageio.write(filepath, a, ElementSpacing=(1, 2, 3))
+    with concurrent.futures.ProcessPoolExecutor(1, mp_context=multiprocessing.get_context('spawn')) as executor:
+        handle = executor.submit(shared.read, filepath, slices=(1, 2)).result()
+    with shared.SharedImage(handle) as image:
+        np.testing.assert_equal(image.image, a[1:3])
+        np.testing.assert_almost_equal(image.meta['ElementSpacing'], (1, 2, 3))
+    handle = shared.read(filepath, slices=())
+    np.testing.assert_equal(shared.SharedImage(handle).image, None)
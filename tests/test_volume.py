@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+import metaimageio
+
+
+@pytest.mark.parametrize('index', (
+    (Ellipsis,),
+    (1,),
+    (-1, Ellipsis, 0),
+    (slice(1, 3), slice(None), slice(None, None, 2)),
+    (slice(None, None, -2), 1, slice(1, None)),
+    (slice(None), slice(0, 2), 3),
+    (slice(2, 2),)))
+def test_getitem(filepath, dtype, index):
+    rng = np.random.default_rng()
+    a = (100 * rng.random((4, 3, 5))).astype(dtype)
+    metaimageio.write(filepath, a)
+    volume = metaimageio.open(filepath)
+    np.testing.assert_equal(volume.shape, a.shape)
+    np.testing.assert_equal(volume.dtype, a.dtype)
+    np.testing.assert_almost_equal(volume[index], a[index])
+
+
+@pytest.mark.parametrize('kwargs', (
+    {'ElementByteOrderMSB': True},
+    {'CompressedData': True},
+    {'ElementDataFile': [f'image{i}.raw' for i in range(4)]}))
+def test_getitem_layout(tmp_path, kwargs):
+    rng = np.random.default_rng()
+    a = (100 * rng.random((4, 3, 5))).astype(np.float32)
+    metaimageio.write(tmp_path / 'image.mhd', a.copy(), **kwargs)
+    volume = metaimageio.open(tmp_path / 'image.mhd')
+    np.testing.assert_almost_equal(volume[1:3, :, ::2], a[1:3, :, ::2])
+    np.testing.assert_almost_equal(np.asarray(volume), a)
+
+
+def test_getitem_header_size_per_slice(filepath_mha):
+    rng = np.random.default_rng()
+    a = (100 * rng.random((4, 3, 5))).astype(np.int16)
+    metaimageio.write(filepath_mha, DimSize=a.shape[::-1], ElementType=a.dtype, HeaderSizePerSlice=5)
+    with filepath_mha.open('ab') as f:
+        for x in a:
+            f.write(bytes(5) + x.tobytes())
+    volume = metaimageio.open(filepath_mha)
+    np.testing.assert_almost_equal(volume[1:, 1, 1:4], a[1:, 1, 1:4])